@@ -0,0 +1,107 @@
+import asyncio
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+from .metrics import Histogram, registry
+
+write_batch_rows = registry.register(Histogram(
+    "write_batch_rows", "Строк в одном пакетном INSERT", ("table",),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+))
+
+
+class InsertBatcher:
+    """
+    Объединение одиночных INSERT в пакетные
+
+    insert(row) кладет строку в очередь; очередь уходит в хранилище одним
+    INSERT массивом, когда набралось max_rows строк или прошло max_delay
+    секунд с первой строки. Каждый вызывающий получает {'data': [своя
+    строка], 'error': ...}, как от storage.insert. Строки сопоставляются по
+    id, который батчер проставляет заранее, а не по порядку ответа.
+
+    Если пакет отклонен целиком (например, одна строка ссылается на
+    несуществующий портфель), строки повторяются по одной, чтобы ошибка
+    досталась только своему вызывающему.
+    """
+
+    def __init__(self, storage, table: str, max_rows: int = 100, max_delay: float = 0.005):
+        self.storage = storage
+        self.table = table
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    async def insert(self, row: Dict) -> Dict:
+        row = {**row, 'id': row.get('id') or str(uuid.uuid4())}
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_rows:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        # Отмена запроса клиентом не отменяет записи остальных строк пакета
+        return await asyncio.shield(future)
+
+    def flush(self):
+        """Отправляет накопленные строки, не дожидаясь таймера"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._write(batch))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def close(self):
+        """Дописывает очередь (при остановке приложения)"""
+        self.flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _write(self, batch: List[Tuple[Dict, asyncio.Future]]):
+        write_batch_rows.observe(len(batch), self.table)
+        try:
+            result = await self.storage.insert(self.table, [row for row, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                _resolve(future, exception=e)
+            return
+
+        if result['error'] and len(batch) > 1:
+            await asyncio.gather(*(self._write_one(row, future) for row, future in batch))
+            return
+        if result['error']:
+            _resolve(batch[0][1], {'data': None, 'error': result['error']})
+            return
+
+        written = {str(row.get('id')): row for row in result['data'] or []}
+        for row, future in batch:
+            inserted = written.get(row['id'])
+            if inserted is None:
+                _resolve(future, {'data': None, 'error': 'Строка не вернулась из пакетного INSERT'})
+            else:
+                _resolve(future, {'data': [inserted], 'error': None})
+
+    async def _write_one(self, row: Dict, future: asyncio.Future):
+        try:
+            _resolve(future, await self.storage.insert(self.table, row))
+        except Exception as e:
+            _resolve(future, exception=e)
+
+    def stats(self) -> Dict:
+        return {"pending": len(self._pending), "writes_in_flight": len(self._writes)}
+
+
+def _resolve(future: asyncio.Future, result: Optional[Dict] = None, exception: Optional[BaseException] = None):
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
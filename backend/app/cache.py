@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Ограниченный LRU-кэш со временем жизни записей
+
+    Каждая запись хранит фильтры запроса, по которым она получена, чтобы
+    инвалидировать только затронутые записи: invalidate({'id': 1}) удаляет
+    записи с id=1 и записи без фильтра по id (например, полный список).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, filters: Optional[Dict] = None):
+        self._data[key] = (time.monotonic() + self.ttl, value, {name: str(v) for name, v in (filters or {}).items()})
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, filters: Optional[Dict] = None):
+        """Удаляет записи, которые могут содержать строки с такими значениями фильтров"""
+        if not filters:
+            self.invalidations += len(self._data)
+            self._data.clear()
+            return
+
+        filters = {key: str(value) for key, value in filters.items()}
+        stale = [
+            key for key, (_, _, entry_filters) in self._data.items()
+            if all(entry_filters.get(name, value) == value for name, value in filters.items())
+        ]
+        for key in stale:
+            del self._data[key]
+        self.invalidations += len(stale)
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
@@ -8,6 +8,47 @@ class Settings:
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
     SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
+    SUPABASE_POOL_SIZE: int = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+    SUPABASE_TIMEOUT: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    
+    # Хранилище: supabase (PostgREST) или sqlite (локальная база)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "supabase").lower()
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "risk.db")
+    
+    # Кэш портфелей (LRU + TTL)
+    PORTFOLIO_CACHE_SIZE: int = int(os.getenv("PORTFOLIO_CACHE_SIZE", "1024"))
+    PORTFOLIO_CACHE_TTL: float = float(os.getenv("PORTFOLIO_CACHE_TTL", "30"))
+    
+    # Monte Carlo: процессов для расчета путей (1 - в текущем процессе)
+    SIMULATION_WORKERS: int = int(os.getenv("SIMULATION_WORKERS", "1"))
+    
+    # Импорт сделок: строк в одном INSERT
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+    
+    # POST /trades пакетами: строки копятся до WRITE_BATCH_MAX_ROWS штук или
+    # WRITE_BATCH_MAX_DELAY_MS миллисекунд и пишутся одним INSERT
+    WRITE_BATCH_ENABLED: bool = os.getenv("WRITE_BATCH_ENABLED", "False").lower() == "true"
+    WRITE_BATCH_MAX_ROWS: int = int(os.getenv("WRITE_BATCH_MAX_ROWS", "100"))
+    WRITE_BATCH_MAX_DELAY_MS: float = float(os.getenv("WRITE_BATCH_MAX_DELAY_MS", "5"))
+    
+    # Сверка балансов портфелей (reconcile_portfolio_balances) раз в
+    # BALANCE_RECONCILE_INTERVAL секунд (0 - выключена); BALANCE_RECONCILE_FIX -
+    # записывать ожидаемый баланс, иначе только считать расхождения
+    BALANCE_RECONCILE_INTERVAL: float = float(os.getenv("BALANCE_RECONCILE_INTERVAL", "0"))
+    BALANCE_RECONCILE_FIX: bool = os.getenv("BALANCE_RECONCILE_FIX", "False").lower() == "true"
+    
+    # Профилирование запросов: заголовок X-Profile с секретом или доля
+    # случайных запросов; профили - кольцо из PROFILE_KEEP файлов в PROFILE_DIR
+    PROFILING_SECRET: str = os.getenv("PROFILING_SECRET", "")
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", "50"))
+    
+    # /stream (SSE): очередь событий на подписчика, предел подписчиков,
+    # интервал комментария-пинга (сек), чтобы прокси не закрывали соединение
+    STREAM_QUEUE_SIZE: int = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+    STREAM_MAX_SUBSCRIBERS: int = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "1000"))
+    STREAM_HEARTBEAT: float = float(os.getenv("STREAM_HEARTBEAT", "15"))
     
     # App settings
     APP_NAME: str = "Risk Management System"
@@ -1,66 +1,475 @@
 import requests
+import httpx
 import os
-from typing import Dict, List, Optional
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple, Union
 from dotenv import load_dotenv
+from sqlalchemy.orm import declarative_base
+from .config import settings
+from .cache import TTLCache
+from .metrics import upstream_call, upstream_coalesced
+from .singleflight import SingleFlight
 
-class SupabaseClient:
-    def __init__(self, url: str, key: str):
+# Загружаем переменные окружения
+load_dotenv()
+
+# Базовый класс SQLAlchemy-моделей (app/models), используется SQLite-хранилищем
+Base = declarative_base()
+
+
+def _filter_params(filters: Optional[Dict]) -> List[Tuple[str, str]]:
+    """Преобразует словарь фильтров в параметры PostgREST (key=eq.value)"""
+    if not filters:
+        return []
+    return [(key, f"eq.{value}") for key, value in filters.items()]
+
+
+def _quote(value) -> str:
+    """Экранирует значение для логических фильтров PostgREST (or/and)"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _keyset_param(order: str, after: Dict) -> Tuple[str, str]:
+    """
+    Строит keyset-фильтр "строго после курсора" для составной сортировки.
+
+    Для order="trade_date.desc,id.desc" и after={trade_date: d, id: i}:
+    or=(trade_date.lt.d,and(trade_date.eq.d,id.lt.i))
+    """
+    columns = []
+    for part in order.split(','):
+        column, _, direction = part.partition('.')
+        columns.append((column, 'lt' if direction.startswith('desc') else 'gt'))
+
+    branches = []
+    for i, (column, op) in enumerate(columns):
+        equals = [f"{prev}.eq.{_quote(after[prev])}" for prev, _ in columns[:i]]
+        condition = f"{column}.{op}.{_quote(after[column])}"
+        branches.append(f"and({','.join(equals + [condition])})" if equals else condition)
+
+    return ('or', f"({','.join(branches)})")
+
+
+def _select_params(
+    select: str,
+    filters: Optional[Dict],
+    order: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    after: Optional[Dict] = None
+) -> List[Tuple[str, str]]:
+    """Собирает параметры SELECT: проекция, фильтры, сортировка, пагинация"""
+    params = [('select', select)] + _filter_params(filters)
+    if order:
+        params.append(('order', order))
+        if after:
+            params.append(_keyset_param(order, after))
+    if limit is not None:
+        params.append(('limit', str(limit)))
+    if offset:
+        params.append(('offset', str(offset)))
+    return params
+
+
+def _json(response):
+    """Тело ответа PostgREST; при return=minimal оно пустое"""
+    return response.json() if response.content else None
+
+
+def _prefer(returning: str, count: bool) -> Dict:
+    """Заголовок Prefer для записи: return=representation|minimal[,count=exact]"""
+    if returning not in ('representation', 'minimal'):
+        raise ValueError(f"returning: representation или minimal, получено {returning!r}")
+    return {'Prefer': f"return={returning}" + (",count=exact" if count else "")}
+
+
+def _count(response) -> Optional[int]:
+    """Число строк из Content-Range ("0-9/10", "*/0") при count=exact"""
+    total = response.headers.get('content-range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+
+def _write_result(response, returning: str, count: bool) -> Dict:
+    """Ответ INSERT/UPDATE/DELETE в формате {'data', 'error'[, 'count']}"""
+    if response.status_code >= 300:
+        return {'data': None, 'error': response.text}
+    result = {'data': (_json(response) or []) if returning == 'representation' else True, 'error': None}
+    if count:
+        result['count'] = _count(response)
+    return result
+
+
+def _headers(key: str) -> Dict:
+    return {
+        'apikey': key,
+        'Authorization': f'Bearer {key}',
+        'Content-Type': 'application/json'
+    }
+
+
+class _BaseClient:
+    """
+    Общая часть клиентов: адрес, заголовки и read-through кэш SELECT
+
+    caches - TTLCache по именам таблиц. Успешные SELECT по этим таблицам
+    кэшируются, запись в таблицу через клиент инвалидирует затронутые записи;
+    изменения, сделанные триггерами БД, инвалидируются через invalidate().
+    """
+
+    def __init__(self, url: str, key: str, caches: Optional[Dict[str, TTLCache]] = None):
         self.url = url.rstrip('/')
         self.key = key
-        self.headers = {
-            'apikey': key,
-            'Authorization': f'Bearer {key}',
-            'Content-Type': 'application/json'
-        }
-    
-    def select(self, table: str, select: str = '*', filters: Optional[Dict] = None) -> Dict:
-        """Выполняет SELECT запрос к таблице"""
-        url = f"{self.url}/rest/v1/{table}?select={select}"
-        
-        if filters:
-            for key, value in filters.items():
-                url += f"&{key}=eq.{value}"
-        
-        response = requests.get(url, headers=self.headers)
-        return {'data': response.json() if response.status_code == 200 else [], 'error': None if response.status_code == 200 else response.text}
-    
-    def insert(self, table: str, data: Dict) -> Dict:
-        """Выполняет INSERT запрос"""
+        self.headers = _headers(key)
+        self.caches = caches or {}
+        # Поколение таблицы растет при каждой инвалидации: чтение, начатое
+        # до записи, не кладет в кэш строки, которые запись уже изменила
+        self._generations: Dict[str, int] = {}
+
+    def invalidate(self, table: str, filters: Optional[Dict] = None):
+        """Сбрасывает кэш таблицы (все записи или затронутые фильтрами)"""
+        self._generations[table] = self._generations.get(table, 0) + 1
+        cache = self.caches.get(table)
+        if cache is not None:
+            cache.invalidate(filters)
+
+    def _generation(self, table: str) -> int:
+        return self._generations.get(table, 0)
+
+    def _cached(self, table: str, params: List[Tuple[str, str]]) -> Optional[Dict]:
+        cache = self.caches.get(table)
+        return cache.get((table, tuple(params))) if cache is not None else None
+
+    def _store(self, table: str, params: List[Tuple[str, str]], filters: Optional[Dict], result: Dict, generation: int) -> Dict:
+        """Кэширует результат, если с начала чтения (generation) таблицу не меняли"""
+        cache = self.caches.get(table)
+        if cache is not None and result['error'] is None and generation == self._generation(table):
+            cache.set((table, tuple(params)), result, filters)
+        return result
+
+
+class SupabaseClient(_BaseClient):
+    """Синхронный клиент PostgREST (для скриптов и утилит)"""
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        timeout: float = settings.SUPABASE_TIMEOUT,
+        caches: Optional[Dict[str, TTLCache]] = None
+    ):
+        super().__init__(url, key, caches)
+        self.timeout = timeout
+        # Сессия держит keep-alive соединения между вызовами
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+
+    def select(
+        self,
+        table: str,
+        select: str = '*',
+        filters: Optional[Dict] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Выполняет SELECT запрос к таблице
+
+        order - сортировка в синтаксисе PostgREST ("trade_date.desc,id.desc"),
+        limit/offset - пагинация на стороне PostgREST,
+        after - keyset-курсор: значения колонок order у последней строки страницы
+        """
         url = f"{self.url}/rest/v1/{table}"
-        response = requests.post(url, json=data, headers=self.headers)
-        return {'data': response.json() if response.status_code == 201 else None, 'error': None if response.status_code == 201 else response.text}
-    
-    def update(self, table: str, data: Dict, filters: Dict) -> Dict:
-        """Выполняет UPDATE запрос"""
+        params = _select_params(select, filters, order, limit, offset, after)
+        cached = self._cached(table, params)
+        if cached is not None:
+            return cached
+
+        generation = self._generation(table)
+        with upstream_call(table, 'select') as call:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            call.error = response.status_code != 200
+        return self._store(table, params, filters, {'data': response.json() if response.status_code == 200 else [], 'error': None if response.status_code == 200 else response.text}, generation)
+
+    def insert(
+        self,
+        table: str,
+        data: Union[Dict, List[Dict]],
+        returning: str = 'representation',
+        count: bool = False
+    ) -> Dict:
+        """
+        Выполняет INSERT запрос (список строк - одним массивным INSERT)
+
+        returning - Prefer: return=representation (вставленные строки в data)
+        или minimal (data=True, тело ответа не передается);
+        count=True - число строк в result['count'] (Prefer: count=exact)
+        """
         url = f"{self.url}/rest/v1/{table}"
-        
-        if filters:
-            filter_params = []
-            for key, value in filters.items():
-                filter_params.append(f"{key}=eq.{value}")
-            url += "?" + "&".join(filter_params)
-        
-        response = requests.patch(url, json=data, headers=self.headers)
-        return {'data': response.json() if response.status_code == 200 else None, 'error': None if response.status_code == 200 else response.text}
-    
-    def delete(self, table: str, filters: Dict) -> Dict:
-        """Выполняет DELETE запрос"""
+        with upstream_call(table, 'insert') as call:
+            response = self.session.post(url, json=data, headers=_prefer(returning, count), timeout=self.timeout)
+            call.error = response.status_code >= 300
+        self.invalidate(table)
+        return _write_result(response, returning, count)
+
+    def update(
+        self,
+        table: str,
+        data: Dict,
+        filters: Dict,
+        returning: str = 'representation',
+        count: bool = False
+    ) -> Dict:
+        """Выполняет UPDATE запрос (returning и count - как у insert)"""
         url = f"{self.url}/rest/v1/{table}"
-        
-        if filters:
-            filter_params = []
-            for key, value in filters.items():
-                filter_params.append(f"{key}=eq.{value}")
-            url += "?" + "&".join(filter_params)
-        
-        response = requests.delete(url, headers=self.headers)
-        return {'data': True if response.status_code == 204 else None, 'error': None if response.status_code == 204 else response.text}
+        with upstream_call(table, 'update') as call:
+            response = self.session.patch(url, json=data, params=_filter_params(filters), headers=_prefer(returning, count), timeout=self.timeout)
+            call.error = response.status_code >= 300
+        self.invalidate(table, filters)
+        return _write_result(response, returning, count)
+
+    def delete(self, table: str, filters: Dict, returning: str = 'minimal', count: bool = False) -> Dict:
+        """
+        Выполняет DELETE запрос
+
+        returning='representation' возвращает удаленные строки: пустой список
+        означает, что удалять было нечего - отдельный SELECT для проверки не нужен
+        """
+        url = f"{self.url}/rest/v1/{table}"
+        with upstream_call(table, 'delete') as call:
+            response = self.session.delete(url, params=_filter_params(filters), headers=_prefer(returning, count), timeout=self.timeout)
+            call.error = response.status_code >= 300
+        self.invalidate(table, filters)
+        return _write_result(response, returning, count)
+
+    def rpc(self, function: str, params: Optional[Dict] = None) -> Dict:
+        """
+        Вызывает SQL-функцию (POST /rest/v1/rpc/{function})
+
+        params - именованные аргументы функции; data - строки результата.
+        Функция выполняется в базе, по сети идет только ее результат.
+        """
+        url = f"{self.url}/rest/v1/rpc/{function}"
+        with upstream_call(function, 'rpc') as call:
+            response = self.session.post(url, json=params or {}, timeout=self.timeout)
+            call.error = response.status_code != 200
+        return {'data': response.json() if response.status_code == 200 else None, 'error': None if response.status_code == 200 else response.text}
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища, через который работает API
+
+    Методы и формат ответа ({'data': ..., 'error': ...}) повторяют
+    AsyncSupabaseClient; фильтры - равенство, order/after - как у PostgREST.
+    Запись: returning='representation' - измененные строки в data,
+    'minimal' - data=True; count=True добавляет result['count'].
+    """
+
+    @abstractmethod
+    async def select(
+        self,
+        table: str,
+        select: str = '*',
+        filters: Optional[Dict] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Optional[Dict] = None,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        ...
+
+    @abstractmethod
+    async def insert(
+        self,
+        table: str,
+        data: Union[Dict, List[Dict]],
+        returning: str = 'representation',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        ...
+
+    @abstractmethod
+    async def update(
+        self,
+        table: str,
+        data: Dict,
+        filters: Dict,
+        returning: str = 'representation',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        ...
+
+    @abstractmethod
+    async def delete(
+        self,
+        table: str,
+        filters: Dict,
+        returning: str = 'minimal',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        ...
+
+    @abstractmethod
+    async def rpc(self, function: str, params: Optional[Dict] = None, timeout: Optional[float] = None) -> Dict:
+        """SQL-функция из supabase_setup.sql с именованными аргументами"""
+
+    def invalidate(self, table: str, filters: Optional[Dict] = None):
+        """Сброс кэша чтения, если он есть"""
+
+    async def aclose(self):
+        """Освобождение соединений"""
+
+
+class AsyncSupabaseClient(_BaseClient, StorageBackend):
+    """
+    Асинхронный клиент PostgREST с общим пулом keep-alive соединений.
+
+    Методы повторяют SupabaseClient, но не блокируют event loop.
+    Таймаут можно переопределить для отдельного вызова через timeout=.
+    Одинаковые (таблица, select, фильтры, порядок, страница) одновременные
+    SELECT, не нашедшиеся в кэше, идут в PostgREST одним запросом (SingleFlight).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        pool_size: int = settings.SUPABASE_POOL_SIZE,
+        timeout: float = settings.SUPABASE_TIMEOUT,
+        caches: Optional[Dict[str, TTLCache]] = None
+    ):
+        super().__init__(url, key, caches)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self.flights = SingleFlight()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Пул создается лениво, при первом запросе"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.url}/rest/v1",
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        """Закрывает пул соединений"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _timeout(self, timeout: Optional[float]):
+        return self.timeout if timeout is None else timeout
+
+    def invalidate(self, table: str, filters: Optional[Dict] = None):
+        """Сбрасывает кэш таблицы; чтения таблицы, начатые до записи, больше не разделяются"""
+        super().invalidate(table, filters)
+        self.flights.forget(lambda key: key[0] == table)
+
+    async def select(
+        self,
+        table: str,
+        select: str = '*',
+        filters: Optional[Dict] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Optional[Dict] = None,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """Выполняет SELECT запрос к таблице (параметры как у SupabaseClient.select)"""
+        params = _select_params(select, filters, order, limit, offset, after)
+        cached = self._cached(table, params)
+        if cached is not None:
+            return cached
+
+        async def fetch() -> Dict:
+            generation = self._generation(table)
+            with upstream_call(table, 'select') as call:
+                response = await self.client.get(f"/{table}", params=params, timeout=self._timeout(timeout))
+                call.error = response.status_code != 200
+            return self._store(table, params, filters, {'data': response.json() if response.status_code == 200 else [], 'error': None if response.status_code == 200 else response.text}, generation)
+
+        # Присоединившиеся получают тот же dict, что и первый: результат не изменяется
+        return await self.flights.do((table, tuple(params)), fetch, lambda: upstream_coalesced.inc(table))
+
+    async def insert(
+        self,
+        table: str,
+        data: Union[Dict, List[Dict]],
+        returning: str = 'representation',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """Выполняет INSERT запрос (параметры как у SupabaseClient.insert)"""
+        with upstream_call(table, 'insert') as call:
+            response = await self.client.post(f"/{table}", json=data, headers=_prefer(returning, count), timeout=self._timeout(timeout))
+            call.error = response.status_code >= 300
+        self.invalidate(table)
+        return _write_result(response, returning, count)
+
+    async def update(
+        self,
+        table: str,
+        data: Dict,
+        filters: Dict,
+        returning: str = 'representation',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """Выполняет UPDATE запрос (параметры как у SupabaseClient.update)"""
+        with upstream_call(table, 'update') as call:
+            response = await self.client.patch(f"/{table}", json=data, params=_filter_params(filters), headers=_prefer(returning, count), timeout=self._timeout(timeout))
+            call.error = response.status_code >= 300
+        self.invalidate(table, filters)
+        return _write_result(response, returning, count)
+
+    async def delete(
+        self,
+        table: str,
+        filters: Dict,
+        returning: str = 'minimal',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """Выполняет DELETE запрос (параметры как у SupabaseClient.delete)"""
+        with upstream_call(table, 'delete') as call:
+            response = await self.client.delete(f"/{table}", params=_filter_params(filters), headers=_prefer(returning, count), timeout=self._timeout(timeout))
+            call.error = response.status_code >= 300
+        self.invalidate(table, filters)
+        return _write_result(response, returning, count)
+
+    async def rpc(self, function: str, params: Optional[Dict] = None, timeout: Optional[float] = None) -> Dict:
+        """Вызывает SQL-функцию (параметры как у SupabaseClient.rpc)"""
+        with upstream_call(function, 'rpc') as call:
+            response = await self.client.post(f"/rpc/{function}", json=params or {}, timeout=self._timeout(timeout))
+            call.error = response.status_code != 200
+        return {'data': response.json() if response.status_code == 200 else None, 'error': None if response.status_code == 200 else response.text}
 
-# Загружаем переменные окружения
-load_dotenv()
 
 # Создаем клиент Supabase
 supabase_url = os.getenv('SUPABASE_URL', '')
 supabase_key = os.getenv('SUPABASE_ANON_KEY', '')
 
-supabase = SupabaseClient(supabase_url, supabase_key) if supabase_url and supabase_key else None 
\ No newline at end of file
+supabase = SupabaseClient(supabase_url, supabase_key) if supabase_url and supabase_key else None
+# Портфели читаются на каждый расчет риска, а меняются редко - кэшируем
+portfolio_cache = TTLCache(maxsize=settings.PORTFOLIO_CACHE_SIZE, ttl=settings.PORTFOLIO_CACHE_TTL)
+
+async_supabase = AsyncSupabaseClient(
+    supabase_url,
+    supabase_key,
+    caches={'portfolios': portfolio_cache}
+) if supabase_url and supabase_key else None
@@ -1,13 +1,62 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from pydantic_core import to_json
+from typing import Optional, List, Literal
+from collections import OrderedDict
+from datetime import date
+from decimal import InvalidOperation
+import asyncio
+import base64
+import json
+import logging
+import math
 import os
-from .database import supabase
+import secrets
+import uuid
+from .database import portfolio_cache
+from . import models
+from .storage import storage
+from .services.calculator import TradingCalculator
+from .services.statistics import TradeStatistics
+from .services.statistics_store import PortfolioStatisticsStore
+from .services.exposure import DIMENSIONS as EXPOSURE_DIMENSIONS, EXPOSURE_COLUMNS, ExposureIndex
+from .services.trade_import import TradeImporter
+from .services.simulation import monte_carlo, r_multiples
+from .services.risk_sweep import kelly_risk_percentage, risk_sweep
+from .services.equity import equity_curve, downsample as downsample_curve
+from .services.trade_export import EXPORTERS, MEDIA_TYPES, parquet_available
+from .config import settings
+from .batching import InsertBatcher
+from .cache import TTLCache
+from .metrics import MetricsMiddleware, cache_collector, registry
+from .profiling import ProfileStore, ProfilingMiddleware
+from .pubsub import PubSub
+from .static_assets import StaticAssets
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Risk Management System")
 
+# Статистика портфелей, обновляемая при записи сделок
+statistics_store = PortfolioStatisticsStore()
+
+# Открытый риск по всем портфелям; строится при первом GET /exposure
+exposure_index = ExposureIndex()
+exposure_lock = asyncio.Lock()
+
+# События записи сделок для подписчиков /stream
+pubsub = PubSub(settings.STREAM_QUEUE_SIZE, settings.STREAM_MAX_SUBSCRIBERS)
+
+# Пакетная запись POST /trades (WRITE_BATCH_ENABLED)
+trade_batcher = (
+    InsertBatcher(storage, 'trades', settings.WRITE_BATCH_MAX_ROWS, settings.WRITE_BATCH_MAX_DELAY_MS / 1000)
+    if storage and settings.WRITE_BATCH_ENABLED else None
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -17,6 +66,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Задержка и статусы по маршрутам для /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Профилирование отдельных запросов (X-Profile: <секрет> или выборка)
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_KEEP)
+app.add_middleware(
+    ProfilingMiddleware,
+    store=profile_store,
+    secret=settings.PROFILING_SECRET,
+    sample_rate=settings.PROFILING_SAMPLE_RATE,
+)
+
+# Фоновая сверка балансов (BALANCE_RECONCILE_INTERVAL)
+balance_reconciliation = {"runs": 0, "errors": 0, "drifted": 0, "fixed": 0}
+reconcile_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_balance_reconciliation():
+    global reconcile_task
+    if storage and settings.BALANCE_RECONCILE_INTERVAL > 0:
+        reconcile_task = asyncio.create_task(reconcile_balances_periodically(settings.BALANCE_RECONCILE_INTERVAL))
+
+@app.on_event("shutdown")
+async def close_storage():
+    """Дописываем очередь сделок и закрываем соединения с хранилищем"""
+    if reconcile_task:
+        reconcile_task.cancel()
+    if trade_batcher:
+        await trade_batcher.close()
+    if storage:
+        await storage.aclose()
+
 # Pydantic модели
 class Portfolio(BaseModel):
     name: str
@@ -26,7 +107,9 @@ class Portfolio(BaseModel):
 
 class Trade(BaseModel):
     portfolio_id: str
-    trade_date: Optional[str] = None
+    user_id: Optional[str] = None
+    # Без даты - сегодняшняя: trade_date входит в курсор /trades и не бывает NULL
+    trade_date: Optional[str] = Field(None, validate_default=True)
     instrument: Optional[str] = None
     timeframe: Optional[str] = None
     risk_amount: float
@@ -37,49 +120,211 @@ class Trade(BaseModel):
     result: Optional[float] = None
     notes: Optional[str] = None
 
+    @field_validator("trade_date")
+    @classmethod
+    def default_trade_date(cls, value: Optional[str]) -> str:
+        return value or date.today().isoformat()
+
 class LotCalculation(BaseModel):
     risk_amount: float
     stop_loss_points: float
 
+class SimulationRequest(BaseModel):
+    paths: int = Field(10000, ge=100, le=200000)
+    trades: int = Field(250, ge=1, le=5000)
+    risk_percentage: Optional[float] = Field(None, gt=0, le=100)
+    ruin_threshold_pct: float = Field(50.0, gt=0, lt=100)
+    seed: Optional[int] = None
+
+class LotBatchCalculation(BaseModel):
+    stop_loss_points: List[float]
+    risk_amount: Optional[List[float]] = None
+    balance: Optional[List[float]] = None
+    risk_percentage: Optional[List[float]] = None
+
 @app.get("/")
 async def root():
     return {"message": "Risk Management System API"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "supabase_connected": supabase is not None}
+    return {"status": "healthy", "storage_connected": storage is not None, "storage_backend": settings.STORAGE_BACKEND}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Счетчики кэша портфелей: попадания, промахи, вытеснения"""
+    return {"portfolios": portfolio_cache.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики в текстовом формате Prometheus: маршруты, хранилище, кэши"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_admin(request: Request):
+    """Админ-маршруты доступны только с заголовком X-Admin-Secret = PROFILING_SECRET"""
+    if not settings.PROFILING_SECRET:
+        raise HTTPException(status_code=404, detail="Профилирование не настроено")
+    provided = request.headers.get("x-admin-secret", "")
+    if not secrets.compare_digest(provided.encode(), settings.PROFILING_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """Сохраненные профили запросов, от новых к старым"""
+    require_admin(request)
+    return await asyncio.to_thread(profile_store.list)
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    """Сводка профиля: топ функций, время по модулям, запросы к хранилищу"""
+    require_admin(request)
+    profile = await asyncio.to_thread(profile_store.load, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return profile
+
+@app.get("/admin/profiles/{profile_id}/download")
+async def download_profile(profile_id: str, request: Request):
+    """Файл pstats: python -m pstats <файл> или snakeviz <файл>"""
+    require_admin(request)
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
 
 @app.post("/calculate-lot")
 async def calculate_lot(calculation: LotCalculation):
     """Расчет размера лота: лот = риск / стоп-лосс / 10"""
+    # JSON допускает NaN и Infinity; Decimal на них падает с InvalidOperation
+    if not (math.isfinite(calculation.risk_amount) and math.isfinite(calculation.stop_loss_points)):
+        raise HTTPException(status_code=400, detail="Риск и стоп-лосс должны быть конечными числами")
     if calculation.stop_loss_points <= 0:
         raise HTTPException(status_code=400, detail="Стоп-лосс должен быть больше 0")
     
-    lot_size = calculation.risk_amount / calculation.stop_loss_points / 10
+    try:
+        lot_size = TradingCalculator.calculate_lot_size(calculation.risk_amount, calculation.stop_loss_points)
+    except InvalidOperation:
+        raise HTTPException(status_code=400, detail="Результат вне допустимого диапазона")
     
     return {
         "risk_amount": calculation.risk_amount,
         "stop_loss_points": calculation.stop_loss_points,
-        "lot_size": round(lot_size, 4)
+        "lot_size": float(lot_size)
     }
 
+@app.post(
+    "/calculate-lot/batch",
+    openapi_extra={"requestBody": {"content": {"application/json": {"schema": LotBatchCalculation.model_json_schema()}}, "required": True}}
+)
+async def calculate_lot_batch(request: Request, mode: Literal["fast", "exact"] = "fast"):
+    """
+    Пакетный расчет лотов за один векторный проход
+    
+    Риск задается массивом risk_amount либо парами balance + risk_percentage.
+    mode=exact считает каждую строку через Decimal (медленнее, для сверки).
+    Ошибки валидации возвращаются построчно, lot_size таких строк = null.
+    Тело разбирается и сериализуется pydantic-core напрямую, минуя
+    json.loads/jsonable_encoder - на 100k строк это основная часть времени.
+    """
+    try:
+        calculation = LotBatchCalculation.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    
+    count = len(calculation.stop_loss_points)
+    if calculation.risk_amount is not None:
+        columns = [calculation.risk_amount]
+    elif calculation.balance is not None and calculation.risk_percentage is not None:
+        columns = [calculation.balance, calculation.risk_percentage]
+    else:
+        raise HTTPException(status_code=400, detail="Укажите risk_amount или balance и risk_percentage")
+    
+    if any(len(column) != count for column in columns):
+        raise HTTPException(status_code=400, detail="Массивы должны быть одинаковой длины")
+    
+    batch = TradingCalculator.calculate_lot_sizes_batch(
+        calculation.stop_loss_points,
+        risk_amounts=calculation.risk_amount,
+        balances=calculation.balance,
+        risk_percentages=calculation.risk_percentage,
+        mode=mode
+    )
+    
+    risk_amounts = batch["risk_amount"].tolist()
+    lot_sizes = batch["lot_size"].tolist()
+    for error in batch["errors"]:
+        risk_amounts[error["index"]] = None
+        lot_sizes[error["index"]] = None
+    
+    return Response(
+        content=to_json({
+            "count": count,
+            "risk_amount": risk_amounts,
+            "lot_size": lot_sizes,
+            "errors": batch["errors"]
+        }),
+        media_type="application/json"
+    )
+
+def projection(fields: Optional[str], model, required: tuple = ()) -> tuple:
+    """
+    Колонки из параметра fields (через запятую), проверенные по модели
+    
+    Возвращает (запрошенные колонки или None - все, select для PostgREST).
+    required - колонки, нужные серверу (например, для курсора); они
+    читаются всегда, а в ответ попадают только запрошенные.
+    """
+    if fields is None:
+        return None, '*'
+    requested = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="Укажите хотя бы одну колонку в fields")
+    columns = model.__table__.c.keys()
+    unknown = [name for name in requested if name not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные колонки: {', '.join(unknown)}")
+    return requested, ",".join(dict.fromkeys(requested + list(required)))
+
+def project(data: list, fields: Optional[list]) -> list:
+    """Строки только с запрошенными колонками (если сервер читал лишние)"""
+    if fields is None or not data or len(data[0]) == len(fields):
+        return data
+    return [{name: row.get(name) for name in fields} for row in data]
+
+def columnar(data: list, fields: Optional[list]) -> dict:
+    """Массив по каждой колонке вместо массива объектов: имена не повторяются в каждой строке"""
+    names = fields if fields is not None else list(data[0]) if data else []
+    return {name: [row.get(name) for row in data] for name in names}
+
+def json_response(content) -> Response:
+    """JSON через pydantic-core, минуя jsonable_encoder"""
+    return Response(content=to_json(content), media_type="application/json")
+
 @app.get("/portfolios")
-async def get_portfolios():
-    """Получить все портфели"""
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase не настроен")
+async def get_portfolios(fields: Optional[str] = None, format: Literal["rows", "columns"] = "rows"):
+    """
+    Получить все портфели
+    
+    fields - нужные колонки через запятую (по умолчанию все);
+    format=columns - {колонка: [значения]} вместо списка объектов.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
     
-    result = supabase.select('portfolios')
+    columns, select = projection(fields, models.Portfolio)
+    result = await storage.select('portfolios', select=select)
     if result['error']:
         raise HTTPException(status_code=500, detail=result['error'])
     
+    if format == "columns":
+        return json_response(columnar(result['data'], columns))
     return result['data']
 
 @app.post("/portfolios")
 async def create_portfolio(portfolio: Portfolio):
     """Создать новый портфель"""
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase не настроен")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
     
     portfolio_data = {
         "name": portfolio.name,
@@ -88,7 +333,7 @@ async def create_portfolio(portfolio: Portfolio):
         "risk_percentage": portfolio.risk_percentage
     }
     
-    result = supabase.insert('portfolios', portfolio_data)
+    result = await storage.insert('portfolios', portfolio_data)
     if result['error']:
         raise HTTPException(status_code=500, detail=result['error'])
     
@@ -97,50 +342,517 @@ async def create_portfolio(portfolio: Portfolio):
 @app.get("/portfolios/{portfolio_id}/risk-amount")
 async def calculate_risk_amount(portfolio_id: str):
     """Рассчитать сумму риска для портфеля"""
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase не настроен")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
     
     # Получаем портфель
-    result = supabase.select('portfolios', filters={'id': portfolio_id})
+    result = await storage.select('portfolios', filters={'id': portfolio_id})
     if result['error'] or not result['data']:
         raise HTTPException(status_code=404, detail="Портфель не найден")
     
     portfolio = result['data'][0]
-    risk_amount = (portfolio['balance'] * portfolio['risk_percentage']) / 100
+    risk_amount = TradingCalculator.calculate_risk_amount(portfolio['balance'], portfolio['risk_percentage'])
     
     return {
         "portfolio_id": portfolio_id,
         "balance": portfolio['balance'],
         "risk_percentage": portfolio['risk_percentage'],
-        "risk_amount": round(risk_amount, 2)
+        "risk_amount": float(risk_amount)
     }
 
+# Порядок страниц /trades: новые сделки первыми, id - для однозначности
+TRADES_ORDER_COLUMNS = ("trade_date", "created_at", "id")
+MAX_TRADES_LIMIT = 1000
+
+def encode_cursor(row: dict) -> str:
+    """Курсор страницы - значения колонок сортировки последней строки"""
+    values = [row.get(column) for column in TRADES_ORDER_COLUMNS]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(TRADES_ORDER_COLUMNS) or None in values:
+            raise ValueError(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return dict(zip(TRADES_ORDER_COLUMNS, values))
+
+def trades_order(direction: str) -> str:
+    return ",".join(f"{column}.{direction}" for column in TRADES_ORDER_COLUMNS)
+
+def rows(data) -> list:
+    """Строки из ответа PostgREST: массив, одиночный объект или пусто"""
+    if isinstance(data, list):
+        return data
+    return [data] if isinstance(data, dict) else []
+
+def balance_changed(trades: list, background_tasks: Optional[BackgroundTasks] = None):
+    """
+    Триггер update_portfolio_balance изменил баланс - сбрасываем кэш портфелей
+    
+    Новый баланс подписчикам /stream рассылается после ответа клиенту.
+    """
+    portfolio_ids = {str(trade['portfolio_id']) for trade in trades}
+    for portfolio_id in portfolio_ids:
+        storage.invalidate('portfolios', {'id': portfolio_id})
+    if background_tasks is not None and portfolio_ids:
+        background_tasks.add_task(publish_balances, portfolio_ids)
+
+def portfolio_topic(portfolio_id) -> str:
+    return f"portfolio:{portfolio_id}"
+
+def publish_trades(event_type: str, trades: list):
+    """Изменения сделок подписчикам их портфелей"""
+    for trade in trades:
+        pubsub.publish(portfolio_topic(trade['portfolio_id']), {"type": event_type, "trade": trade})
+
+async def portfolio_balance(portfolio_id: str) -> Optional[dict]:
+    result = await storage.select('portfolios', select='id,balance,updated_at', filters={'id': portfolio_id})
+    return result['data'][0] if not result['error'] and result['data'] else None
+
+async def publish_balances(portfolio_ids):
+    """Баланс после триггера - только портфелям, у которых есть подписчики"""
+    for portfolio_id in portfolio_ids:
+        topic = portfolio_topic(portfolio_id)
+        if not pubsub.has_subscribers(topic):
+            continue
+        portfolio = await portfolio_balance(portfolio_id)
+        if portfolio is not None:
+            pubsub.publish(topic, {"type": "portfolio.balance", "portfolio": portfolio})
+
+async def reconcile_balances(portfolio_id: Optional[str] = None, fix: bool = False) -> dict:
+    """Сверка баланса с initial_balance + сумма результатов сделок (функция reconcile_portfolio_balances)"""
+    result = await storage.rpc('reconcile_portfolio_balances', {"p_portfolio_id": portfolio_id, "p_fix": fix})
+    if not result['error']:
+        for row in result['data']:
+            if row['fixed']:
+                storage.invalidate('portfolios', {'id': str(row['portfolio_id'])})
+    return result
+
+async def reconcile_balances_periodically(interval: float):
+    """
+    Периодическая сверка всех портфелей
+    
+    Триггер баланса держит его согласованным сам; сверка страхует от
+    ручных правок в базе и от сбоев между версиями триггера.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        result = await reconcile_balances(fix=settings.BALANCE_RECONCILE_FIX)
+        balance_reconciliation["runs"] += 1
+        if result['error']:
+            balance_reconciliation["errors"] += 1
+            continue
+        fixed = {str(row['portfolio_id']) for row in result['data'] if row['fixed']}
+        balance_reconciliation["drifted"] = sum(1 for row in result['data'] if row['drift'] and not row['fixed'])
+        balance_reconciliation["fixed"] += len(fixed)
+        await publish_balances(fixed)
+
+async def iter_trade_pages(
+    portfolio_id: Optional[str] = None,
+    select: str = '*',
+    page_size: int = MAX_TRADES_LIMIT,
+    direction: str = "asc"
+):
+    """Страницы сделок (всех или одного портфеля) keyset-курсором, лениво"""
+    after = None
+    filters = {'portfolio_id': portfolio_id} if portfolio_id else None
+    while True:
+        result = await storage.select(
+            'trades',
+            select=select,
+            filters=filters,
+            order=trades_order(direction),
+            limit=page_size,
+            after=after
+        )
+        if result['error']:
+            raise HTTPException(status_code=500, detail=result['error'])
+        
+        yield result['data']
+        
+        if len(result['data']) < page_size:
+            return
+        after = {column: result['data'][-1][column] for column in TRADES_ORDER_COLUMNS}
+
+async def iter_trades(portfolio_id: str, select: str = '*', page_size: int = MAX_TRADES_LIMIT):
+    """Сделки портфеля в хронологическом порядке"""
+    async for page in iter_trade_pages(portfolio_id, select=select, page_size=page_size):
+        for trade in page:
+            yield trade
+
+@app.get("/portfolios/{portfolio_id}/statistics")
+async def get_portfolio_statistics(portfolio_id: str, full: bool = False):
+    """
+    Статистика портфеля
+    
+    По умолчанию отдается из хранилища агрегатов за O(1); при первом
+    обращении агрегаты строятся по истории сделок. full=true - полный
+    потоковый пересчет с сериями и просадкой.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    if full:
+        statistics = TradeStatistics()
+        async for trade in iter_trades(portfolio_id, select='id,result,' + ','.join(TRADES_ORDER_COLUMNS)):
+            statistics.add(trade)
+        return {"portfolio_id": portfolio_id, **statistics.as_dict()}
+    
+    cached = statistics_store.get(portfolio_id)
+    if cached is None:
+        version = statistics_store.version(portfolio_id)
+        trades = [trade async for trade in iter_trades(portfolio_id, select='id,portfolio_id,result,' + ','.join(TRADES_ORDER_COLUMNS))]
+        cached = statistics_store.rebuild(portfolio_id, trades, version=version)
+    
+    return {"portfolio_id": portfolio_id, **cached}
+
+@app.get("/portfolios/{portfolio_id}/statistics/verify")
+async def verify_portfolio_statistics(portfolio_id: str):
+    """Сверка хранилища агрегатов с полным пересчетом по истории"""
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    trades = [trade async for trade in iter_trades(portfolio_id, select='id,result,' + ','.join(TRADES_ORDER_COLUMNS))]
+    return {"portfolio_id": portfolio_id, **statistics_store.check_consistency(portfolio_id, trades)}
+
+@app.post("/portfolios/{portfolio_id}/balance/recompute")
+async def recompute_portfolio_balance(portfolio_id: str, background_tasks: BackgroundTasks, fix: bool = False):
+    """
+    Пересчет баланса портфеля по сделкам
+    
+    Ожидаемый баланс - initial_balance плюс сумма результатов сделок;
+    drift - его отличие от хранимого. fix=true записывает ожидаемый баланс.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    result = await reconcile_balances(portfolio_id, fix)
+    if result['error']:
+        raise HTTPException(status_code=500, detail=result['error'])
+    if not result['data']:
+        raise HTTPException(status_code=404, detail="Портфель не найден")
+    
+    row = result['data'][0]
+    if row['fixed']:
+        background_tasks.add_task(publish_balances, {portfolio_id})
+    return row
+
+# Измерения GET /portfolios/{id}/breakdown (аргумент p_group_by функции trade_breakdown)
+BREAKDOWN_DIMENSIONS = ("instrument", "timeframe", "month")
+
+@app.get("/portfolios/{portfolio_id}/breakdown")
+async def get_portfolio_breakdown(
+    portfolio_id: str,
+    group_by: str = "instrument,timeframe,month",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+):
+    """
+    Статистика сделок по инструменту, таймфрейму и месяцу
+    
+    group_by - измерения через запятую из instrument, timeframe, month
+    (пусто - одна строка на весь портфель). Группы считает SQL-функция
+    trade_breakdown в базе: по сети идут только агрегаты, а не сделки.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    dimensions = tuple(d.strip() for d in group_by.split(",") if d.strip())
+    unknown = [d for d in dimensions if d not in BREAKDOWN_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные измерения: {', '.join(unknown)}")
+    
+    result = await storage.rpc('trade_breakdown', {
+        "p_portfolio_id": portfolio_id,
+        "p_group_by": list(dimensions),
+        "p_date_from": date_from.isoformat() if date_from else None,
+        "p_date_to": date_to.isoformat() if date_to else None
+    })
+    if result['error']:
+        raise HTTPException(status_code=500, detail=result['error'])
+    
+    return {"portfolio_id": portfolio_id, "group_by": list(dimensions), "groups": result['data']}
+
+# Предел объема одной симуляции: пути × сделки
+MAX_SIMULATION_STEPS = 100_000_000
+
+@app.post("/portfolios/{portfolio_id}/simulate")
+async def simulate_portfolio(portfolio_id: str, simulation: SimulationRequest):
+    """
+    Monte Carlo симуляция риска разорения
+    
+    Исторические R-мультипликаторы сделок (result / risk_amount)
+    перемешиваются bootstrap-ом в paths путей по trades сделок; риск
+    каждой сделки - risk_percentage от текущего баланса.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    if simulation.paths * simulation.trades > MAX_SIMULATION_STEPS:
+        raise HTTPException(status_code=400, detail=f"paths × trades не должно превышать {MAX_SIMULATION_STEPS}")
+    
+    result = await storage.select('portfolios', filters={'id': portfolio_id})
+    if result['error'] or not result['data']:
+        raise HTTPException(status_code=404, detail="Портфель не найден")
+    portfolio = result['data'][0]
+    
+    trades = [trade async for trade in iter_trades(portfolio_id, select='id,result,risk_amount,' + ','.join(TRADES_ORDER_COLUMNS))]
+    r = r_multiples(trades)
+    if not len(r):
+        raise HTTPException(status_code=400, detail="Нет закрытых сделок для симуляции")
+    
+    # Расчет занимает секунды - выносим его из event loop
+    report = await asyncio.to_thread(
+        monte_carlo,
+        r,
+        float(portfolio['balance']),
+        simulation.risk_percentage or float(portfolio['risk_percentage']),
+        n_paths=simulation.paths,
+        n_trades=simulation.trades,
+        ruin_threshold_pct=simulation.ruin_threshold_pct,
+        seed=simulation.seed,
+        workers=settings.SIMULATION_WORKERS
+    )
+    return {"portfolio_id": portfolio_id, "initial_balance": portfolio['balance'], **report}
+
+@app.get("/portfolios/{portfolio_id}/risk-sweep")
+async def portfolio_risk_sweep(
+    portfolio_id: str,
+    risk: List[float] = Query([0.25, 0.5, 1.0, 2.0], description="Проценты риска для сравнения")
+):
+    """
+    Каким был бы баланс при другом проценте риска
+    
+    R-мультипликаторы сделок переигрываются по порядку от initial_balance
+    для каждого процента сетки; добавляется точка Келли (максимум
+    ожидаемого log-роста).
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    if not risk or len(risk) > 100 or any(value <= 0 or value > 100 for value in risk):
+        raise HTTPException(status_code=400, detail="Укажите от 1 до 100 процентов риска в диапазоне (0, 100]")
+    
+    result = await storage.select('portfolios', filters={'id': portfolio_id})
+    if result['error'] or not result['data']:
+        raise HTTPException(status_code=404, detail="Портфель не найден")
+    portfolio = result['data'][0]
+    
+    trades = [
+        trade async for trade in iter_trades(portfolio_id, select='id,result,risk_amount,' + ','.join(TRADES_ORDER_COLUMNS))
+        if trade['result'] is not None and trade['risk_amount']
+    ]
+    if not trades:
+        raise HTTPException(status_code=400, detail="Нет закрытых сделок")
+    
+    r = r_multiples(trades)
+    kelly = kelly_risk_percentage(r)
+    grid = sorted(set(risk) | ({kelly["risk_percentage"]} if kelly and kelly["risk_percentage"] > 0 else set()))
+    dates = [trade['trade_date'] for trade in trades if trade['trade_date']]
+    
+    scenarios = risk_sweep(
+        r,
+        float(portfolio['initial_balance']),
+        grid,
+        start=date.fromisoformat(dates[0]) if dates else None,
+        end=date.fromisoformat(dates[-1]) if dates else None
+    )
+    for scenario in scenarios:
+        scenario["kelly"] = bool(kelly) and scenario["risk_percentage"] == kelly["risk_percentage"]
+    
+    return {
+        "portfolio_id": portfolio_id,
+        "initial_balance": portfolio['initial_balance'],
+        "trades": len(trades),
+        "kelly": kelly,
+        "scenarios": scenarios
+    }
+
+# Кривые капитала; ключ включает счетчик записей сделок портфеля из
+# statistics_store (его двигает каждая запись через API, включая сделки с
+# нулевым результатом, после которых баланс и updated_at не меняются) и
+# updated_at - для изменений в базе мимо API
+equity_cache = TTLCache(maxsize=256, ttl=3600)
+registry.add_collector(cache_collector({"portfolios": portfolio_cache, "equity": equity_cache}))
+
+def stream_collector():
+    stats = pubsub.stats()
+    yield "# TYPE stream_subscribers gauge"
+    yield f"stream_subscribers {stats['subscribers']}"
+    yield "# TYPE stream_events_dropped_total counter"
+    yield f"stream_events_dropped_total {stats['dropped']}"
+
+registry.add_collector(stream_collector)
+
+def reconciliation_collector():
+    for field, kind in (("runs", "counter"), ("errors", "counter"), ("drifted", "gauge"), ("fixed", "counter")):
+        metric = f"balance_reconcile_{field}_total" if kind == "counter" else f"balance_reconcile_{field}"
+        yield f"# TYPE {metric} {kind}"
+        yield f"{metric} {balance_reconciliation[field]}"
+
+registry.add_collector(reconciliation_collector)
+
+@app.get("/portfolios/{portfolio_id}/equity-curve")
+async def get_equity_curve(
+    portfolio_id: str,
+    downsample: Optional[Literal["lttb", "daily"]] = None,
+    points: int = Query(500, ge=3, le=10000)
+):
+    """
+    Кривая капитала и просадки портфеля
+    
+    Баланс, пик, просадка и ее длительность считаются от initial_balance
+    по закрытым сделкам. downsample=lttb сокращает ряд до points точек,
+    daily - до одной точки на день.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    result = await storage.select('portfolios', filters={'id': portfolio_id})
+    if result['error'] or not result['data']:
+        raise HTTPException(status_code=404, detail="Портфель не найден")
+    portfolio = result['data'][0]
+    
+    cache_key = (
+        portfolio_id,
+        statistics_store.version(portfolio_id),
+        portfolio.get('updated_at'),
+        downsample,
+        points if downsample == "lttb" else None
+    )
+    cached = equity_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    results, dates = [], []
+    async for trade in iter_trades(portfolio_id, select='id,result,' + ','.join(TRADES_ORDER_COLUMNS)):
+        if trade['result'] is not None:
+            results.append(trade['result'])
+            dates.append(trade['trade_date'])
+    
+    curve = equity_curve(float(portfolio['initial_balance']), results)
+    payload = {
+        "portfolio_id": portfolio_id,
+        "initial_balance": portfolio['initial_balance'],
+        "trades": len(results),
+        "max_drawdown": round(float(curve["drawdown"].max(initial=0)), 2),
+        "max_drawdown_pct": round(float(curve["drawdown_pct"].max(initial=0)), 2),
+        "max_drawdown_duration": int(curve["drawdown_duration"].max(initial=0)),
+        **downsample_curve(curve, dates, downsample, points)
+    }
+    equity_cache.set(cache_key, payload)
+    return payload
+
+async def ensure_exposure_index():
+    """Первичная загрузка индекса открытого риска (один раз на процесс)"""
+    if exposure_index.ready:
+        return
+    async with exposure_lock:
+        # Импорт, завершившийся во время загрузки, сбрасывает индекс
+        # (invalidate) - тогда загрузка повторяется с начала
+        while not exposure_index.ready:
+            build = exposure_index.begin_build()
+            try:
+                async for page in iter_trade_pages(select=EXPOSURE_COLUMNS + ',' + ','.join(TRADES_ORDER_COLUMNS)):
+                    exposure_index.load(page, build)
+            except BaseException:
+                exposure_index.invalidate()
+                raise
+            exposure_index.finish_build(build)
+
+@app.get("/exposure")
+async def get_exposure(
+    group_by: str = "instrument,direction",
+    portfolio_id: Optional[str] = None,
+    instrument: Optional[str] = None,
+    direction: Optional[str] = None,
+    account_type: Optional[str] = None
+):
+    """
+    Открытый риск (сделки без result) по всем портфелям
+    
+    group_by - измерения через запятую: portfolio_id, instrument, direction,
+    account_type (пусто - только итог); остальные параметры - отбор.
+    Ответ строится из индекса в памяти без чтения сделок; индекс
+    загружается при первом запросе и обновляется при записи сделок.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    dimensions = tuple(d.strip() for d in group_by.split(",") if d.strip())
+    unknown = [d for d in dimensions if d not in EXPOSURE_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные измерения: {', '.join(unknown)}")
+    
+    await ensure_exposure_index()
+    filters = {"portfolio_id": portfolio_id, "instrument": instrument, "direction": direction, "account_type": account_type}
+    return {"group_by": list(dimensions), **exposure_index.query(dimensions, filters)}
+
 @app.get("/trades")
-async def get_trades(portfolio_id: Optional[str] = None, limit: int = 50):
-    """Получить сделки"""
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase не настроен")
+async def get_trades(
+    portfolio_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_TRADES_LIMIT),
+    cursor: Optional[str] = None,
+    order: Literal["desc", "asc"] = "desc",
+    fields: Optional[str] = None,
+    format: Literal["rows", "columns"] = "rows"
+):
+    """
+    Получить сделки постранично
+
+    Сортировка по trade_date/created_at, пагинация keyset-курсором:
+    каждая страница стоит одинаково независимо от глубины.
+    Следующая страница - тот же запрос с cursor=next_cursor.
+    fields - нужные колонки через запятую (например, id,instrument,result);
+    format=columns - data в виде {колонка: [значения]}.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
     
+    columns, select = projection(fields, models.Trade, required=TRADES_ORDER_COLUMNS)
     filters = {'portfolio_id': portfolio_id} if portfolio_id else None
-    result = supabase.select('trades', filters=filters)
+    result = await storage.select(
+        'trades',
+        select=select,
+        filters=filters,
+        order=trades_order(order),
+        limit=limit,
+        after=decode_cursor(cursor) if cursor else None
+    )
     
     if result['error']:
         raise HTTPException(status_code=500, detail=result['error'])
     
-    return result['data'][:limit]
+    trades = result['data']
+    next_cursor = encode_cursor(trades[-1]) if len(trades) == limit else None
+    
+    data = columnar(trades, columns) if format == "columns" else project(trades, columns)
+    return json_response({"data": data, "count": len(trades), "next_cursor": next_cursor})
 
 @app.post("/trades")
-async def create_trade(trade: Trade):
+async def create_trade(trade: Trade, background_tasks: BackgroundTasks):
     """Создать новую сделку"""
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase не настроен")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
     
     trade_data = trade.dict()
     
-    result = supabase.insert('trades', trade_data)
+    if trade_batcher:
+        result = await trade_batcher.insert(trade_data)
+    else:
+        result = await storage.insert('trades', trade_data)
     if result['error']:
         raise HTTPException(status_code=500, detail=result['error'])
     
+    for row in rows(result['data']):
+        statistics_store.apply_insert(row)
+        exposure_index.apply(row)
+    publish_trades("trade.created", rows(result['data']))
+    balance_changed([row for row in rows(result['data']) if row.get('result') is not None], background_tasks)
+    
     return result['data']
 
 class TradeUpdate(BaseModel):
@@ -152,11 +864,110 @@ class TradeUpdate(BaseModel):
     result: Optional[float] = None
     notes: Optional[str] = None
 
+@app.get("/trades/export")
+async def export_trades(
+    format: Literal["csv", "ndjson", "parquet"] = "csv",
+    portfolio_id: Optional[str] = None,
+    page_size: int = Query(MAX_TRADES_LIMIT, ge=1, le=MAX_TRADES_LIMIT)
+):
+    """
+    Потоковая выгрузка сделок в CSV, NDJSON или Parquet
+    
+    Страницы читаются из PostgREST по мере отправки ответа, поэтому
+    память не зависит от объема истории. Parquet требует pyarrow.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Для Parquet установите pyarrow")
+    
+    pages = iter_trade_pages(portfolio_id, page_size=page_size)
+    # Первая страница читается до ответа: ошибка upstream вернется статусом 500
+    first_page = await pages.__anext__()
+    
+    async def all_pages():
+        yield first_page
+        exported = len(first_page)
+        try:
+            async for page in pages:
+                yield page
+                exported += len(page)
+        except HTTPException as e:
+            # Статус 200 уже отправлен: исключение здесь только оборвало бы
+            # соединение посреди строки. Завершаем поток на границе страницы
+            # и оставляем причину в логе
+            logger.error(
+                "Выгрузка сделок %s прервана после %d строк: %s",
+                portfolio_id or "all", exported, e.detail
+            )
+    
+    filename = f"trades-{portfolio_id or 'all'}.{format}"
+    return StreamingResponse(
+        EXPORTERS[format](all_pages()),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Прогресс импортов: идущие и несколько последних завершенных
+trade_imports: "OrderedDict[str, dict]" = OrderedDict()
+MAX_TRACKED_IMPORTS = 100
+
+@app.post("/trades/import")
+async def import_trades(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    batch_size: int = Query(settings.IMPORT_BATCH_SIZE, ge=1, le=10000),
+    import_id: Optional[str] = None
+):
+    """
+    Потоковый импорт сделок из CSV или NDJSON
+    
+    Тело читается по частям, строки проверяются моделью Trade и
+    вставляются пакетами по batch_size одним запросом к PostgREST.
+    Прогресс идущего импорта - GET /trades/import/{import_id}.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    
+    import_id = import_id or uuid.uuid4().hex
+    if import_id in trade_imports and trade_imports[import_id]["status"] == "running":
+        raise HTTPException(status_code=409, detail="Импорт с таким import_id уже идет")
+    
+    # Вставленные строки импорту не нужны - тело ответа не запрашиваем
+    importer = TradeImporter(Trade, lambda batch: storage.insert('trades', batch, returning='minimal'), batch_size=batch_size)
+    trade_imports[import_id] = importer.progress
+    while len(trade_imports) > MAX_TRACKED_IMPORTS:
+        trade_imports.popitem(last=False)
+    
+    try:
+        summary = await importer.run(request.stream(), format)
+    finally:
+        # Вставка прошла мимо хранилища статистики, индекса риска и кэша портфелей
+        if importer.portfolio_ids:
+            exposure_index.invalidate()
+        for portfolio_id in importer.portfolio_ids:
+            statistics_store.invalidate(portfolio_id)
+            storage.invalidate('portfolios', {'id': portfolio_id})
+    
+    return {"import_id": import_id, **summary}
+
+@app.get("/trades/import/{import_id}")
+async def get_import_progress(import_id: str):
+    """Прогресс импорта сделок"""
+    if import_id not in trade_imports:
+        raise HTTPException(status_code=404, detail="Импорт не найден")
+    return {"import_id": import_id, **trade_imports[import_id]}
+
 @app.put("/trades/{trade_id}")
-async def update_trade(trade_id: int, trade_update: TradeUpdate):
+async def update_trade(trade_id: str, trade_update: TradeUpdate, background_tasks: BackgroundTasks):
     """Обновить сделку"""
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase не настроен")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
     
     # Получаем только непустые поля для обновления
     update_data = {k: v for k, v in trade_update.dict().items() if v is not None}
@@ -164,39 +975,103 @@ async def update_trade(trade_id: int, trade_update: TradeUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="Нет данных для обновления")
     
-    result = supabase.update('trades', update_data, filters={'id': trade_id})
+    result = await storage.update('trades', update_data, filters={'id': trade_id})
     if result['error']:
         raise HTTPException(status_code=500, detail=result['error'])
     
     if not result['data']:
         raise HTTPException(status_code=404, detail="Сделка не найдена")
     
+    for row in rows(result['data']):
+        statistics_store.apply_update(row)
+        exposure_index.apply(row)
+    publish_trades("trade.updated", rows(result['data']))
+    if 'result' in update_data:
+        balance_changed(rows(result['data']), background_tasks)
+    
     return result['data']
 
 @app.delete("/trades/{trade_id}")
-async def delete_trade(trade_id: int):
+async def delete_trade(trade_id: str, background_tasks: BackgroundTasks):
     """Удалить сделку"""
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase не настроен")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
     
-    # Сначала проверяем существование сделки
-    result = supabase.select('trades', filters={'id': trade_id})
+    # Удаление и проверка существования одним запросом: удаленные строки
+    # возвращаются в ответе (Prefer: return=representation)
+    result = await storage.delete('trades', filters={'id': trade_id}, returning='representation')
     if result['error']:
         raise HTTPException(status_code=500, detail=result['error'])
     
-    if not result['data']:
+    deleted = rows(result['data'])
+    if not deleted:
         raise HTTPException(status_code=404, detail="Сделка не найдена")
     
-    # Удаляем сделку
-    result = supabase.delete('trades', filters={'id': trade_id})
-    if result['error']:
-        raise HTTPException(status_code=500, detail=result['error'])
+    for row in deleted:
+        statistics_store.apply_delete(row)
+        exposure_index.remove(row['id'])
+    publish_trades("trade.deleted", deleted)
+    balance_changed([row for row in deleted if row.get('result') is not None], background_tasks)
     
     return {"message": "Сделка успешно удалена", "trade_id": trade_id}
 
-# Статические файлы (фронтенд)
-if os.path.exists("../"):
-    app.mount("/", StaticFiles(directory="../", html=True), name="static")
+def sse(event: dict) -> str:
+    """Событие в формате Server-Sent Events"""
+    return f"event: {event['type']}\ndata: {to_json(event).decode()}\n\n"
+
+@app.get("/stream")
+async def stream(portfolio_id: List[str] = Query(...)):
+    """
+    Server-Sent Events: изменения сделок и баланса портфелей
+    
+    События: portfolio.balance (сразу после подключения и после каждой
+    записи, меняющей баланс), trade.created / trade.updated / trade.deleted
+    и resync - клиент отстал, промежуточные события отброшены, состояние
+    нужно перечитать. В паузах приходит комментарий-пинг.
+    """
+    if not storage:
+        raise HTTPException(status_code=500, detail="Хранилище не настроено")
+    
+    portfolio_ids = list(dict.fromkeys(portfolio_id))
+    
+    # Подписка до ответа: при переполнении клиент получает 503, а не
+    # оборванный поток после 200; до чтения снимка - записи, пришедшие
+    # во время чтения, не теряются
+    try:
+        subscription = pubsub.subscribe(portfolio_topic(pid) for pid in portfolio_ids)
+    except OverflowError:
+        raise HTTPException(status_code=503, detail="Слишком много подписчиков, повторите позже")
+    
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            for pid in portfolio_ids:
+                portfolio = await portfolio_balance(pid)
+                if portfolio is not None:
+                    yield sse({"type": "portfolio.balance", "portfolio": portfolio})
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), settings.STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield sse(event)
+        finally:
+            pubsub.unsubscribe(subscription)
+    
+    # Фоновая задача снимает подписку и тогда, когда клиент отключился
+    # до первого события и генератор так и не был запущен
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(pubsub.unsubscribe, subscription)
+    )
+
+# Статические файлы (фронтенд): только перечисленные, сжатые при старте
+STATIC_FILES = ("index.html", "script.js", "style.css", "supabase.js", "simple-calculator.html")
+if os.path.exists("../index.html"):
+    app.mount("/", StaticAssets("../", STATIC_FILES), name="static")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,214 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .profiling import record_span
+
+# Границы корзин гистограмм задержки, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Gauge(Counter):
+    """Значение, которое может расти и падать"""
+
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами
+
+    Наблюдение - бинарный поиск корзины и два сложения; накопительные
+    суммы по корзинам считаются только при выдаче /metrics.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # метки -> [счетчики по корзинам (+Inf последней), сумма]
+        self.values: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.labels, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    """Набор метрик и функций, добавляющих значения в момент выдачи"""
+
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP-запросы по маршруту, методу и статусу", ("route", "method", "status")
+))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ("route", "method")
+))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Запросы в обработке", ("method",)
+))
+upstream_latency = registry.register(Histogram(
+    "upstream_request_duration_seconds", "Время запросов к хранилищу (PostgREST или SQLite)", ("table", "verb")
+))
+upstream_errors = registry.register(Counter(
+    "upstream_errors_total", "Ошибки запросов к хранилищу", ("table", "verb")
+))
+upstream_coalesced = registry.register(Counter(
+    "upstream_coalesced_total", "Чтения, присоединенные к такому же запросу в полете", ("table",)
+))
+
+
+def observe_upstream(table: str, verb: str, started: float, error: bool):
+    """Учет одного запроса к хранилищу; started - time.perf_counter() до запроса"""
+    duration = time.perf_counter() - started
+    upstream_latency.observe(duration, table, verb)
+    record_span(table, verb, duration)
+    if error:
+        upstream_errors.inc(table, verb)
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: задержка, статусы и запросы в обработке по маршрутам
+
+    Маршрут берется из шаблона пути (/trades/{trade_id}), а не из URL,
+    чтобы число рядов метрик не росло с числом id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec(method)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<other>"
+            http_latency.observe(time.perf_counter() - started, path, method)
+            http_requests.inc(path, method, str(status))
+
+
+def cache_collector(caches: Dict[str, object]) -> Callable[[], Iterable[str]]:
+    """Счетчики TTLCache (имя -> кэш) в формате Prometheus"""
+    def collect():
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"),
+                            ("expirations", "counter"), ("invalidations", "counter"), ("size", "gauge")):
+            metric = f"cache_{field}_total" if kind == "counter" else f"cache_{field}"
+            yield f"# TYPE {metric} {kind}"
+            for name, values in stats.items():
+                yield f'{metric}{{cache="{_escape(name)}"}} {values[field]}'
+    return collect
+
+
+class upstream_call:
+    """
+    Замер запроса к хранилищу:
+
+        with upstream_call('trades', 'select') as call:
+            response = ...
+            call.error = response.status_code != 200
+    """
+
+    __slots__ = ("table", "verb", "started", "error")
+
+    def __init__(self, table: str, verb: str):
+        self.table = table
+        self.verb = verb
+        self.error = False
+
+    def __enter__(self) -> "upstream_call":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        observe_upstream(self.table, self.verb, self.started, self.error or exc_type is not None)
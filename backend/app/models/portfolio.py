@@ -10,7 +10,7 @@ class Portfolio(Base):
     __tablename__ = "portfolios"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), index=True)
     name = Column(String, nullable=False)
     balance = Column(DECIMAL(15, 2), nullable=False)
     initial_balance = Column(DECIMAL(15, 2), nullable=False)
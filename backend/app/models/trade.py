@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, DECIMAL, Date, Text, Enum
+from sqlalchemy import Column, String, DateTime, ForeignKey, DECIMAL, Date, Text, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -14,12 +14,18 @@ class TradeDirection(enum.Enum):
 
 class Trade(Base):
     __tablename__ = "trades"
+    __table_args__ = (
+        # Keyset-пагинация сделок портфеля (как idx_trades_portfolio_page)
+        Index("ix_trades_portfolio_page", "portfolio_id", "trade_date", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    portfolio_id = Column(UUID(as_uuid=True), ForeignKey("portfolios.id"), nullable=False)
+    portfolio_id = Column(UUID(as_uuid=True), ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Владелец (auth.users в Supabase, по нему работают политики RLS)
+    user_id = Column(UUID(as_uuid=True), index=True)
     
     # Trade details
-    trade_date = Column(Date, default=func.current_date())
+    trade_date = Column(Date, nullable=False, default=func.current_date(), index=True)
     instrument = Column(String)  # XAUUSD, EURUSD, etc.
     timeframe = Column(String)   # M15, H1, D1, etc.
     
@@ -30,7 +36,7 @@ class Trade(Base):
     
     # Additional trade info
     account_type = Column(String)  # Demo, Real, etc.
-    direction = Column(Enum(TradeDirection))
+    direction = Column(Enum(TradeDirection, values_callable=lambda enum: [member.value for member in enum]))
     
     # Result (can be null initially)
     result = Column(DECIMAL(10, 2))  # Profit/Loss in dollars
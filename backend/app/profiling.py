@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import secrets
+import time
+import uuid
+from typing import Dict, List, Optional
+
+# Каталог пакета app: по нему профиль сводит время по модулям приложения
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+TOP_FUNCTIONS = 30
+
+# Запросы к хранилищу внутри профилируемого запроса (None - профиль не пишется)
+_spans: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar("profile_spans", default=None)
+
+
+def record_span(table: str, verb: str, duration: float):
+    """Запрос к хранилищу в профиль текущего запроса, если он профилируется"""
+    spans = _spans.get()
+    if spans is not None:
+        spans.append({"table": table, "verb": verb, "duration_ms": round(duration * 1000, 3)})
+
+
+def summarize(profiler: cProfile.Profile) -> Dict:
+    """Топ функций по накопленному времени и собственное время по модулям app"""
+    stats = pstats.Stats(profiler).stats
+    top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+
+    modules: Dict[str, float] = {}
+    for (filename, _, _), (_, _, tottime, _, _) in stats.items():
+        if filename.startswith(APP_DIR):
+            module = os.path.relpath(filename, APP_DIR)
+            modules[module] = modules.get(module, 0.0) + tottime
+
+    return {
+        "functions": [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "calls": calls,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3)
+            }
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in top
+        ],
+        "modules_ms": {module: round(value * 1000, 3) for module, value in sorted(modules.items(), key=lambda item: -item[1])}
+    }
+
+
+class ProfileStore:
+    """
+    Кольцо профилей на диске: {id}.prof (pstats, открывается snakeviz или
+    python -m pstats) и {id}.json со сводкой. Хранятся последние keep штук.
+    """
+
+    ID_PATTERN = re.compile(r"^\d{8}T\d{9}-[0-9a-f]{8}$")
+
+    def __init__(self, directory: str, keep: int = 50):
+        self.directory = directory
+        self.keep = max(1, keep)
+
+    def new_id(self) -> str:
+        """Id растет со временем: сортировка по имени - хронологическая"""
+        now = time.time()
+        return f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+
+    def path(self, profile_id: str, kind: str = "prof") -> Optional[str]:
+        """Путь к файлу профиля; None для чужих имен и отсутствующих файлов"""
+        if not self.ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{kind}")
+        return path if os.path.exists(path) else None
+
+    def _ids(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        ids = {name.rsplit(".", 1)[0] for name in os.listdir(self.directory)}
+        return sorted(profile_id for profile_id in ids if self.ID_PATTERN.match(profile_id))
+
+    def save(self, profile_id: str, profiler: cProfile.Profile, meta: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+            json.dump({**meta, **summarize(profiler)}, f, ensure_ascii=False)
+
+        for stale in self._ids()[:-self.keep]:
+            for kind in ("prof", "json"):
+                try:
+                    os.remove(os.path.join(self.directory, f"{stale}.{kind}"))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, profile_id: str) -> Optional[Dict]:
+        path = self.path(profile_id, "json")
+        if path is None:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self) -> List[Dict]:
+        """Профили от новых к старым, без списка функций"""
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            meta = self.load(profile_id)
+            if meta is not None:
+                profiles.append({key: value for key, value in meta.items() if key not in ("functions", "spans")})
+        return profiles
+
+
+class ProfilingMiddleware:
+    """
+    ASGI-middleware: cProfile для выбранных запросов
+
+    Запрос профилируется, если пришел заголовок X-Profile с секретом или
+    он попал в долю sample_rate. Id профиля возвращается в X-Profile-Id.
+    cProfile видит весь поток event loop, поэтому одновременно пишется
+    только один профиль, а остальные запросы в это время идут без него.
+    Время ожидания хранилища корутины не занимают - оно пишется отдельно,
+    списком spans с таблицей, операцией и длительностью.
+    """
+
+    def __init__(self, app, store: ProfileStore, secret: str = "", sample_rate: float = 0.0, skip_prefix: str = "/admin/"):
+        self.app = app
+        self.store = store
+        self.secret = secret.encode()
+        self.sample_rate = sample_rate
+        self.skip_prefix = skip_prefix
+        self.active = False
+
+    def _wanted(self, scope) -> bool:
+        if scope["path"].startswith(self.skip_prefix):
+            return False
+        if self.secret:
+            for name, value in scope["headers"]:
+                if name == b"x-profile" and secrets.compare_digest(value, self.secret):
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.active or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+
+        self.active = True
+        profile_id = self.store.new_id()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        spans: List[Dict] = []
+        token = _spans.set(spans)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            _spans.reset(token)
+            self.active = False
+
+            route = scope.get("route")
+            meta = {
+                "id": profile_id,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "route": getattr(route, "path", None),
+                "status": status,
+                "duration_ms": round(duration * 1000, 3),
+                "upstream_ms": round(sum(span["duration_ms"] for span in spans), 3),
+                "spans": spans
+            }
+            try:
+                await asyncio.to_thread(self.store.save, profile_id, profiler, meta)
+            except OSError:
+                # Профиль не должен ронять запрос: диск полон или каталог недоступен
+                pass
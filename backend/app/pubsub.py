@@ -0,0 +1,95 @@
+import asyncio
+from typing import Dict, Iterable, Set
+
+# Событие, которое получает подписчик, отставший больше чем на размер очереди:
+# промежуточные события отброшены, состояние нужно перечитать
+RESYNC = {"type": "resync"}
+
+
+class Subscription:
+    """Подписка на набор тем с ограниченной очередью событий"""
+
+    __slots__ = ("topics", "queue", "dropped", "active")
+
+    def __init__(self, topics: Set[str], queue_size: int):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.active = True
+
+    def offer(self, event: Dict) -> bool:
+        """
+        Кладет событие без ожидания
+
+        Публикующий (обработчик записи) никогда не ждет медленного клиента:
+        при переполнении очередь очищается и в нее кладется одно событие
+        resync - память на подписчика ограничена размером очереди.
+        """
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            return False
+
+    async def get(self) -> Dict:
+        return await self.queue.get()
+
+
+class PubSub:
+    """Рассылка событий внутри процесса по темам (portfolio:{id})"""
+
+    def __init__(self, queue_size: int = 100, max_subscribers: int = 1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self.subscribers = 0
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        if self.subscribers >= self.max_subscribers:
+            raise OverflowError("Достигнут предел подписчиков")
+        subscription = Subscription(set(topics), self.queue_size)
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Снять подписку; повторный вызов ничего не делает"""
+        if not subscription.active:
+            return
+        subscription.active = False
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+        self.subscribers -= 1
+        self.dropped += subscription.dropped
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def publish(self, topic: str, event: Dict) -> int:
+        """Событие всем подписчикам темы; возвращает число получателей"""
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        self.published += 1
+        for subscription in subscribers:
+            subscription.offer(event)
+        return len(subscribers)
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": self.subscribers,
+            "topics": len(self._topics),
+            "published": self.published,
+            "dropped": self.dropped + sum(s.dropped for s in set().union(*self._topics.values()))
+        }
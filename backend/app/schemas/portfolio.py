@@ -46,4 +46,11 @@ class PortfolioStatistics(BaseModel):
     largest_win: Decimal
     largest_loss: Decimal
     average_win: Decimal
-    average_loss: Decimal 
\ No newline at end of file
+    average_loss: Decimal
+    completed_trades: int = 0
+    net_pnl: Decimal = Decimal("0")
+    profit_factor: Optional[Decimal] = None
+    expectancy: Decimal = Decimal("0")
+    max_consecutive_wins: int = 0
+    max_consecutive_losses: int = 0
+    max_drawdown: Decimal = Decimal("0") 
\ No newline at end of file
@@ -1,29 +1,97 @@
-from decimal import Decimal
-from typing import Tuple
+import math
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .statistics import TradeStatistics
+
+# Режимы калькулятора: exact - Decimal с квантованием на каждом шаге,
+# fast - float/NumPy с квантованием только на выходе
+EXACT = "exact"
+FAST = "fast"
+
+# Знаки после запятой, как у колонок DECIMAL(10, 2) и DECIMAL(10, 4) в models/trade.py
+MONEY_PLACES = 2
+LOT_PLACES = 4
+MONEY = Decimal("0.01")
+LOT = Decimal("0.0001")
+
+# Допуск float-округления: ошибка представления 0.125 и т.п. меньше него,
+# поэтому половина кванта округляется вверх так же, как ROUND_HALF_UP
+_HALF_UP_EPSILON = 1e-9
+
+Number = Union[Decimal, float]
+
+
+def quantize(value: Decimal, exponent: Decimal) -> Decimal:
+    """Округление Decimal до кванта (MONEY, LOT) по правилу half-up"""
+    return value.quantize(exponent, rounding=ROUND_HALF_UP)
+
+
+def round_half_up(value: float, places: int) -> float:
+    """Float-аналог quantize: половина кванта - от нуля, как ROUND_HALF_UP"""
+    scale = 10 ** places
+    return math.copysign(math.floor(abs(value) * scale + 0.5 + _HALF_UP_EPSILON) / scale, value)
+
+
+def round_half_up_array(values: np.ndarray, places: int) -> np.ndarray:
+    """round_half_up для массива"""
+    scale = 10 ** places
+    return np.copysign(np.floor(np.abs(values) * scale + 0.5 + _HALF_UP_EPSILON) / scale, values)
+
+
+def to_decimal(value: Number) -> Decimal:
+    """Decimal из числа; float - через str, чтобы 0.1 не стал 0.1000000000000000055"""
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _check_mode(mode: str):
+    if mode not in (EXACT, FAST):
+        raise ValueError(f"Режим калькулятора: {EXACT} или {FAST}, получено {mode!r}")
 
 
 class TradingCalculator:
-    """Сервис для торговых вычислений"""
+    """
+    Сервис для торговых вычислений
+    
+    Один API в двух режимах (параметр mode):
+    - EXACT: Decimal, риск и баланс квантуются до 0.01, лот до 0.0001
+      (ROUND_HALF_UP) - как значения, которые сохранит база;
+    - FAST: float/NumPy для массовой аналитики, те же формулы и то же
+      правило округления, примененное только к результату.
+    Для входов с точностью колонок базы режимы дают одинаковый результат
+    (проверка: python -m benchmarks.agreement).
+    """
     
     @staticmethod
-    def calculate_risk_amount(balance: Decimal, risk_percentage: Decimal) -> Decimal:
+    def calculate_risk_amount(balance: Number, risk_percentage: Number, mode: str = EXACT) -> Number:
         """
         Вычисляет сумму риска в долларах
         
         Args:
             balance: Текущий баланс портфеля
             risk_percentage: Процент риска (например, 0.5 для 0.5%)
+            mode: EXACT (Decimal) или FAST (float)
             
         Returns:
-            Сумма риска в долларах
+            Сумма риска в долларах, округленная до центов
         """
+        _check_mode(mode)
+        if mode == FAST:
+            balance, risk_percentage = float(balance), float(risk_percentage)
+            if balance <= 0 or risk_percentage <= 0:
+                return 0.0
+            return round_half_up(balance * risk_percentage / 100, MONEY_PLACES)
+        
+        balance, risk_percentage = to_decimal(balance), to_decimal(risk_percentage)
         if balance <= 0 or risk_percentage <= 0:
             return Decimal("0")
         
-        return (balance * risk_percentage) / 100
+        return quantize((balance * risk_percentage) / 100, MONEY)
     
     @staticmethod
-    def calculate_lot_size(risk_amount: Decimal, stop_loss_points: Decimal) -> Decimal:
+    def calculate_lot_size(risk_amount: Number, stop_loss_points: Number, mode: str = EXACT) -> Number:
         """
         Вычисляет размер лота
         
@@ -32,121 +100,171 @@ class TradingCalculator:
         Args:
             risk_amount: Сумма риска в долларах
             stop_loss_points: Стоп-лосс в пунктах
+            mode: EXACT (Decimal) или FAST (float)
             
         Returns:
-            Размер лота
+            Размер лота, округленный до 0.0001
         """
+        _check_mode(mode)
+        if mode == FAST:
+            risk_amount, stop_loss_points = float(risk_amount), float(stop_loss_points)
+            if risk_amount <= 0 or stop_loss_points <= 0:
+                return 0.0
+            return round_half_up(risk_amount / stop_loss_points / 10, LOT_PLACES)
+        
+        risk_amount, stop_loss_points = to_decimal(risk_amount), to_decimal(stop_loss_points)
         if risk_amount <= 0 or stop_loss_points <= 0:
             return Decimal("0")
         
-        return risk_amount / stop_loss_points / 10
+        return quantize(risk_amount / stop_loss_points / 10, LOT)
     
     @staticmethod
     def calculate_trade_data(
-        balance: Decimal, 
-        risk_percentage: Decimal, 
-        stop_loss_points: Decimal
-    ) -> Tuple[Decimal, Decimal]:
+        balance: Number, 
+        risk_percentage: Number, 
+        stop_loss_points: Number,
+        mode: str = EXACT
+    ) -> Tuple[Number, Number]:
         """
         Вычисляет данные для сделки
         
+        Лот считается от уже округленного риска - того, что попадет в базу.
+        
         Args:
             balance: Текущий баланс
             risk_percentage: Процент риска
             stop_loss_points: Стоп-лосс в пунктах
+            mode: EXACT (Decimal) или FAST (float)
             
         Returns:
             Tuple[risk_amount, lot_size]
         """
-        risk_amount = TradingCalculator.calculate_risk_amount(balance, risk_percentage)
-        lot_size = TradingCalculator.calculate_lot_size(risk_amount, stop_loss_points)
+        risk_amount = TradingCalculator.calculate_risk_amount(balance, risk_percentage, mode)
+        lot_size = TradingCalculator.calculate_lot_size(risk_amount, stop_loss_points, mode)
         
         return risk_amount, lot_size
     
     @staticmethod
-    def calculate_new_balance(current_balance: Decimal, trade_result: Decimal) -> Decimal:
+    def calculate_lot_sizes_batch(
+        stop_loss_points: Sequence[float],
+        risk_amounts: Optional[Sequence[float]] = None,
+        balances: Optional[Sequence[float]] = None,
+        risk_percentages: Optional[Sequence[float]] = None,
+        mode: str = FAST
+    ) -> Dict:
+        """
+        Вычисляет риск и лот для массива сделок
+        
+        Та же математика, что в calculate_trade_data: риск = баланс × % / 100,
+        лот = риск ÷ стоп-лосс ÷ 10. Риск берется из risk_amounts, либо
+        считается из пар balances + risk_percentages. В режиме FAST весь
+        массив считается векторно за один проход, в EXACT - поэлементно
+        через Decimal (для сверки и малых объемов).
+        
+        Args:
+            stop_loss_points: Стоп-лоссы в пунктах
+            risk_amounts: Суммы риска в долларах
+            balances: Балансы (вместе с risk_percentages)
+            risk_percentages: Проценты риска
+            mode: FAST (NumPy) или EXACT (Decimal)
+            
+        Returns:
+            Словарь с массивами risk_amount, lot_size (float64, округлены
+            до 2 и 4 знаков) и маской valid; для невалидных строк значения 0,
+            а errors содержит {"index", "detail"}
+        """
+        _check_mode(mode)
+        stop_loss = np.asarray(stop_loss_points, dtype=np.float64)
+        
+        # NaN и бесконечности (JSON допускает NaN, Infinity и 1e400) - ошибки
+        # строк, а не 0 или inf в ответе
+        if risk_amounts is not None:
+            risk = np.asarray(risk_amounts, dtype=np.float64)
+            invalid_risk = ~(np.isfinite(risk) & (risk > 0))
+            risk_error = "Риск должен быть конечным числом больше 0"
+        else:
+            balance = np.asarray(balances, dtype=np.float64)
+            percentage = np.asarray(risk_percentages, dtype=np.float64)
+            with np.errstate(over="ignore", invalid="ignore"):
+                risk = balance * percentage / 100
+            invalid_risk = ~(np.isfinite(risk) & (balance > 0) & (percentage > 0))
+            risk = np.where(invalid_risk, 0.0, risk)
+            risk_error = "Баланс и процент риска должны быть конечными числами больше 0"
+        
+        invalid_stop = ~(np.isfinite(stop_loss) & (stop_loss > 0))
+        valid = ~(invalid_risk | invalid_stop)
+        
+        if mode == FAST:
+            with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+                risk = np.where(valid, round_half_up_array(risk, MONEY_PLACES), 0.0)
+                lot_size = np.where(valid, round_half_up_array(risk / stop_loss / 10, LOT_PLACES), 0.0)
+        else:
+            risk, lot_size = np.zeros(len(stop_loss)), np.zeros(len(stop_loss))
+            for index in np.flatnonzero(valid).tolist():
+                try:
+                    if risk_amounts is not None:
+                        exact_risk = quantize(to_decimal(risk_amounts[index]), MONEY)
+                    else:
+                        exact_risk = TradingCalculator.calculate_risk_amount(balances[index], risk_percentages[index])
+                    exact_lot = TradingCalculator.calculate_lot_size(exact_risk, stop_loss_points[index])
+                    risk[index], lot_size[index] = float(exact_risk), float(exact_lot)
+                except InvalidOperation:
+                    # Больше точности контекста Decimal - как переполнение в FAST
+                    risk[index] = lot_size[index] = np.inf
+        
+        # Конечные входы с переполнением при умножении, делении или округлении
+        overflow = valid & ~(np.isfinite(risk) & np.isfinite(lot_size))
+        valid &= ~overflow
+        risk = np.where(valid, risk, 0.0)
+        lot_size = np.where(valid, lot_size, 0.0)
+        
+        errors: List[Dict] = []
+        for index in np.flatnonzero(~valid).tolist():
+            if invalid_risk[index]:
+                detail = risk_error
+            elif invalid_stop[index]:
+                detail = "Стоп-лосс должен быть конечным числом больше 0"
+            else:
+                detail = "Результат вне допустимого диапазона"
+            errors.append({"index": index, "detail": detail})
+        
+        return {
+            "risk_amount": risk,
+            "lot_size": lot_size,
+            "valid": valid,
+            "errors": errors
+        }
+    
+    @staticmethod
+    def calculate_new_balance(current_balance: Number, trade_result: Number, mode: str = EXACT) -> Number:
         """
         Вычисляет новый баланс после сделки
         
         Args:
             current_balance: Текущий баланс
             trade_result: Результат сделки (прибыль/убыток)
+            mode: EXACT (Decimal) или FAST (float)
             
         Returns:
-            Новый баланс
+            Новый баланс, округленный до центов
         """
-        return current_balance + trade_result
+        _check_mode(mode)
+        if mode == FAST:
+            return round_half_up(float(current_balance) + float(trade_result), MONEY_PLACES)
+        return quantize(to_decimal(current_balance) + to_decimal(trade_result), MONEY)
     
     @staticmethod
-    def calculate_portfolio_statistics(trades_data: list) -> dict:
+    def calculate_portfolio_statistics(trades_data: Iterable) -> dict:
         """
         Вычисляет статистику портфеля
         
+        Один проход по итератору сделок через TradeStatistics, поэтому
+        сделки можно подавать генератором, не загружая историю целиком.
+        
         Args:
-            trades_data: Список данных сделок с полем result
+            trades_data: Сделки (объекты или dict) с полем result
             
         Returns:
             Словарь со статистикой
         """
-        if not trades_data:
-            return {
-                "total_trades": 0,
-                "winning_trades": 0,
-                "losing_trades": 0,
-                "win_rate": Decimal("0"),
-                "total_profit": Decimal("0"),
-                "total_loss": Decimal("0"),
-                "net_pnl": Decimal("0"),
-                "largest_win": Decimal("0"),
-                "largest_loss": Decimal("0"),
-                "average_win": Decimal("0"),
-                "average_loss": Decimal("0")
-            }
-        
-        # Фильтруем только сделки с результатами
-        completed_trades = [trade for trade in trades_data if trade.result is not None]
-        
-        if not completed_trades:
-            return {
-                "total_trades": len(trades_data),
-                "winning_trades": 0,
-                "losing_trades": 0,
-                "win_rate": Decimal("0"),
-                "total_profit": Decimal("0"),
-                "total_loss": Decimal("0"),
-                "net_pnl": Decimal("0"),
-                "largest_win": Decimal("0"),
-                "largest_loss": Decimal("0"),
-                "average_win": Decimal("0"),
-                "average_loss": Decimal("0")
-            }
-        
-        winning_trades = [trade for trade in completed_trades if trade.result > 0]
-        losing_trades = [trade for trade in completed_trades if trade.result < 0]
-        
-        total_profit = sum(trade.result for trade in winning_trades)
-        total_loss = sum(trade.result for trade in losing_trades)  # Уже отрицательные
-        net_pnl = total_profit + total_loss
-        
-        win_rate = (len(winning_trades) / len(completed_trades)) * 100 if completed_trades else Decimal("0")
-        
-        largest_win = max((trade.result for trade in winning_trades), default=Decimal("0"))
-        largest_loss = min((trade.result for trade in losing_trades), default=Decimal("0"))
-        
-        average_win = total_profit / len(winning_trades) if winning_trades else Decimal("0")
-        average_loss = total_loss / len(losing_trades) if losing_trades else Decimal("0")
-        
-        return {
-            "total_trades": len(trades_data),
-            "completed_trades": len(completed_trades),
-            "winning_trades": len(winning_trades),
-            "losing_trades": len(losing_trades),
-            "win_rate": Decimal(str(round(win_rate, 2))),
-            "total_profit": total_profit,
-            "total_loss": total_loss,
-            "net_pnl": net_pnl,
-            "largest_win": largest_win,
-            "largest_loss": largest_loss,
-            "average_win": average_win,
-            "average_loss": average_loss
-        } 
\ No newline at end of file
+        return TradeStatistics.from_trades(trades_data).as_dict()
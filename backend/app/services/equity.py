@@ -0,0 +1,105 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def equity_curve(initial_balance: float, results: Sequence[float]) -> Dict[str, np.ndarray]:
+    """
+    Кривая капитала по результатам закрытых сделок в хронологическом порядке
+
+    Все ряды считаются накопительными операциями NumPy без цикла по сделкам.
+    Пик учитывает начальный баланс; длительность просадки - число сделок
+    с последнего пика.
+
+    Returns:
+        Словарь массивов balance, peak, drawdown, drawdown_pct, drawdown_duration
+    """
+    pnl = np.asarray(results, dtype=np.float64)
+    balance = initial_balance + np.cumsum(pnl)
+    peak = np.maximum(np.maximum.accumulate(balance), initial_balance) if len(balance) else balance
+    drawdown = peak - balance
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown_pct = np.where(peak > 0, drawdown / peak * 100, 0.0)
+
+    # Индекс последнего пика: позиции на пике, протянутые вперед maximum.accumulate
+    steps = np.arange(1, len(balance) + 1)
+    last_peak = np.maximum.accumulate(np.where(drawdown == 0, steps, 0)) if len(balance) else steps
+    drawdown_duration = steps - last_peak
+
+    return {
+        "balance": balance,
+        "peak": peak,
+        "drawdown": drawdown,
+        "drawdown_pct": drawdown_pct,
+        "drawdown_duration": drawdown_duration
+    }
+
+
+def lttb_indices(values: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Индексы точек по алгоритму Largest-Triangle-Three-Buckets
+
+    Сохраняет форму ряда (пики и провалы) при сокращении до threshold точек.
+    Первая и последняя точки остаются всегда.
+    """
+    count = len(values)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    x = np.arange(count, dtype=np.float64)
+    edges = np.linspace(1, count - 1, threshold - 1).astype(int)
+    selected = [0]
+
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else count
+        next_start = end
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = values[next_start:next_end].mean() if next_end > next_start else values[-1]
+
+        a = selected[-1]
+        area = np.abs(
+            (x[a] - avg_x) * (values[start:end] - values[a])
+            - (x[a] - x[start:end]) * (avg_y - values[a])
+        )
+        selected.append(start + int(np.argmax(area)))
+
+    selected.append(count - 1)
+    return np.asarray(selected)
+
+
+def daily_indices(dates: Sequence[Optional[str]]) -> np.ndarray:
+    """Индекс последней сделки каждого дня (даты идут по возрастанию)"""
+    days = np.asarray([date or "" for date in dates])
+    if not len(days):
+        return np.arange(0)
+    last_of_day = np.append(days[1:] != days[:-1], True)
+    return np.flatnonzero(last_of_day)
+
+
+def downsample(curve: Dict[str, np.ndarray], dates: List[Optional[str]], mode: Optional[str], points: int) -> Dict[str, list]:
+    """
+    Прореживает кривую: lttb - до points точек, daily - конец каждого дня
+
+    Для daily просадка точки - максимальная за день, чтобы дневные провалы
+    не терялись.
+    """
+    if mode == "lttb":
+        indices = lttb_indices(curve["balance"], points)
+    elif mode == "daily":
+        indices = daily_indices(dates)
+    else:
+        indices = np.arange(len(dates))
+
+    series = {name: values[indices] for name, values in curve.items()}
+    if mode == "daily" and len(indices):
+        starts = np.concatenate(([0], indices[:-1] + 1))
+        series["drawdown"] = np.maximum.reduceat(curve["drawdown"], starts)
+        series["drawdown_pct"] = np.maximum.reduceat(curve["drawdown_pct"], starts)
+        series["drawdown_duration"] = np.maximum.reduceat(curve["drawdown_duration"], starts)
+
+    payload = {name: np.round(values, 2).tolist() for name, values in series.items()}
+    payload["drawdown_duration"] = series["drawdown_duration"].astype(int).tolist()
+    payload["trade_date"] = [dates[i] for i in indices.tolist()]
+    return payload
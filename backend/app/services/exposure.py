@@ -0,0 +1,174 @@
+from decimal import Decimal
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .calculator import LOT, MONEY, quantize, to_decimal
+
+# Измерения, по которым агрегируется открытый риск
+DIMENSIONS = ("portfolio_id", "instrument", "direction", "account_type")
+# Колонки сделки, нужные индексу
+EXPOSURE_COLUMNS = "id,result,risk_amount,lot_size," + ",".join(DIMENSIONS)
+
+
+class _Bucket:
+    __slots__ = ("risk_amount", "lot_size", "open_trades")
+
+    def __init__(self):
+        self.risk_amount = Decimal("0")
+        self.lot_size = Decimal("0")
+        self.open_trades = 0
+
+    def as_dict(self) -> Dict:
+        return {
+            "risk_amount": float(quantize(self.risk_amount, MONEY)),
+            "lot_size": float(quantize(self.lot_size, LOT)),
+            "open_trades": self.open_trades
+        }
+
+
+class ExposureIndex:
+    """
+    Открытый риск (сделки с result = null) по инструменту, направлению,
+    портфелю и типу счета
+
+    Суммы поддерживаются сразу для всех сочетаний измерений (16 групп),
+    поэтому запрос - чтение готовой группы, без прохода по сделкам, а
+    запись сделки обновляет по одной корзине в каждой группе.
+
+    Все изменения идемпотентны по id сделки (apply заменяет прошлую версию,
+    remove удаляет), поэтому записи, пришедшие во время первичной загрузки
+    (begin_build → load → finish_build), копятся и повторяются после нее.
+    До загрузки индекс не готов и записи игнорирует. invalidate во время
+    загрузки делает ее устаревшей: load и finish_build с прошлым токеном
+    ничего не меняют, и загрузку нужно начать заново.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._pending: Optional[List[Tuple[str, object]]] = None
+        self._build = 0
+        self._reset()
+
+    def _reset(self):
+        # id сделки -> (значения измерений, риск, лот) для открытых сделок
+        self._trades: Dict[str, Tuple[Tuple, Decimal, Decimal]] = {}
+        self._groups: Dict[Tuple[str, ...], Dict[Tuple, _Bucket]] = {
+            dimensions: {}
+            for size in range(len(DIMENSIONS) + 1)
+            for dimensions in combinations(DIMENSIONS, size)
+        }
+
+    def _add(self, trade: Dict):
+        if trade.get("result") is not None:
+            return
+        values = tuple(None if trade.get(d) is None else str(trade[d]) for d in DIMENSIONS)
+        risk = to_decimal(trade.get("risk_amount") or 0)
+        lot = to_decimal(trade.get("lot_size") or 0)
+        self._trades[str(trade["id"])] = (values, risk, lot)
+        for dimensions, group in self._groups.items():
+            key = tuple(value for d, value in zip(DIMENSIONS, values) if d in dimensions)
+            bucket = group.get(key)
+            if bucket is None:
+                bucket = group[key] = _Bucket()
+            bucket.risk_amount += risk
+            bucket.lot_size += lot
+            bucket.open_trades += 1
+
+    def _remove(self, trade_id: str):
+        entry = self._trades.pop(str(trade_id), None)
+        if entry is None:
+            return
+        values, risk, lot = entry
+        for dimensions, group in self._groups.items():
+            key = tuple(value for d, value in zip(DIMENSIONS, values) if d in dimensions)
+            bucket = group[key]
+            bucket.risk_amount -= risk
+            bucket.lot_size -= lot
+            bucket.open_trades -= 1
+            if not bucket.open_trades:
+                del group[key]
+
+    def apply(self, trade: Dict):
+        """Новая или измененная сделка (строка целиком)"""
+        if self._pending is not None:
+            self._pending.append(("apply", trade))
+        elif self.ready:
+            self._remove(trade["id"])
+            self._add(trade)
+
+    def remove(self, trade_id: str):
+        """Удаленная сделка"""
+        if self._pending is not None:
+            self._pending.append(("remove", trade_id))
+        elif self.ready:
+            self._remove(trade_id)
+
+    def invalidate(self):
+        """Сброс: индекс пересоберется при следующем запросе"""
+        self._build += 1
+        self.ready = False
+        self._pending = None
+        self._reset()
+
+    def begin_build(self) -> int:
+        """Начало загрузки; возвращает токен для load и finish_build"""
+        self._build += 1
+        self.ready = False
+        self._pending = []
+        self._reset()
+        return self._build
+
+    def load(self, trades: Iterable[Dict], build: int):
+        """Страница сделок из хранилища во время первичной загрузки"""
+        if build != self._build:
+            return
+        for trade in trades:
+            self._remove(trade["id"])
+            self._add(trade)
+
+    def finish_build(self, build: int) -> bool:
+        """Завершает загрузку; False - был invalidate, загрузка устарела"""
+        if build != self._build:
+            return False
+        pending, self._pending = self._pending or [], None
+        for action, payload in pending:
+            if action == "apply":
+                self._remove(payload["id"])
+                self._add(payload)
+            else:
+                self._remove(payload)
+        self.ready = True
+        return True
+
+    def query(self, group_by: Tuple[str, ...] = (), filters: Optional[Dict[str, str]] = None) -> Dict:
+        """
+        Агрегаты открытого риска
+
+        Args:
+            group_by: Измерения группировки (подмножество DIMENSIONS)
+            filters: Значения измерений для отбора
+
+        Returns:
+            {"total": {...}, "groups": [{измерения..., risk_amount, lot_size, open_trades}]}
+        """
+        filters = {d: str(v) for d, v in (filters or {}).items() if v is not None}
+        dimensions = tuple(d for d in DIMENSIONS if d in group_by or d in filters)
+        group = self._groups[dimensions]
+        if not group_by:
+            # Только фильтры - одна корзина
+            bucket = group.get(tuple(filters[d] for d in dimensions))
+            return {"total": (bucket or _Bucket()).as_dict(), "groups": []}
+
+        total = _Bucket()
+        groups = []
+        for key, bucket in group.items():
+            values = dict(zip(dimensions, key))
+            if any(values[d] != v for d, v in filters.items()):
+                continue
+            total.risk_amount += bucket.risk_amount
+            total.lot_size += bucket.lot_size
+            total.open_trades += bucket.open_trades
+            groups.append({**{d: values[d] for d in DIMENSIONS if d in group_by}, **bucket.as_dict()})
+
+        groups.sort(key=lambda row: row["risk_amount"], reverse=True)
+        return {"total": total.as_dict(), "groups": groups}
@@ -0,0 +1,77 @@
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def risk_sweep(
+    r: np.ndarray,
+    initial_balance: float,
+    risk_percentages: Sequence[float],
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> List[Dict]:
+    """
+    Переигрывает историю сделок при разных процентах риска
+
+    На каждом шаге риск = текущий баланс × %, лот = риск ÷ стоп ÷ 10
+    (calculate_lot_size), а результат = лот × стоп × 10 × R = риск × R.
+    Поэтому вся сетка считается одной матрицей: баланс[i, t] =
+    initial × cumprod(1 + f_i × R_t) без цикла по сценариям.
+
+    Args:
+        r: R-мультипликаторы сделок в хронологическом порядке
+        initial_balance: Стартовый баланс
+        risk_percentages: Сетка процентов риска
+        start, end: Даты первой и последней сделки для годовой доходности
+
+    Returns:
+        По строке на процент риска: итоговый баланс, доходность, просадка
+    """
+    fractions = np.asarray(risk_percentages, dtype=np.float64)[:, None] / 100
+    factors = np.maximum(1.0 + fractions * r[None, :], 0.0)
+    balance = initial_balance * np.cumprod(factors, axis=1)
+
+    peak = np.maximum(np.maximum.accumulate(balance, axis=1), initial_balance)
+    max_drawdown = np.max((peak - balance) / peak, axis=1) * 100 if r.size else np.zeros(len(fractions))
+    final = balance[:, -1] if r.size else np.full(len(fractions), float(initial_balance))
+
+    growth = final / initial_balance
+    per_trade = growth ** (1 / r.size) - 1 if r.size else np.zeros(len(fractions))
+    years = (end - start).days / 365.25 if start and end and end > start else None
+    annual = growth ** (1 / years) - 1 if years else None
+
+    return [
+        {
+            "risk_percentage": float(risk_percentages[i]),
+            "final_balance": round(float(final[i]), 2),
+            "total_return_pct": round(float(growth[i] - 1) * 100, 2),
+            "growth_per_trade_pct": round(float(per_trade[i]) * 100, 4),
+            "annualized_return_pct": round(float(annual[i]) * 100, 2) if annual is not None else None,
+            "max_drawdown_pct": round(float(max_drawdown[i]), 2),
+            "ruined": bool(final[i] <= 0)
+        }
+        for i in range(len(fractions))
+    ]
+
+
+def kelly_risk_percentage(r: np.ndarray, resolution: int = 2000) -> Optional[Dict]:
+    """
+    Процент риска, максимизирующий ожидаемый log-рост (критерий Келли)
+
+    G(f) = mean(log(1 + f × R)) вычисляется сразу для сетки f до границы,
+    за которой худшая сделка обнуляет баланс.
+    """
+    if not r.size or r.mean() <= 0:
+        return None
+
+    worst = r.min()
+    limit = 1.0 / -worst if worst < 0 else 1.0
+    fractions = np.linspace(0, limit, resolution, endpoint=False)[1:]
+    growth = np.log1p(fractions[:, None] * r[None, :]).mean(axis=1)
+    best = int(np.argmax(growth))
+
+    return {
+        "risk_percentage": round(float(fractions[best]) * 100, 2),
+        "growth_per_trade_pct": round(float(np.expm1(growth[best])) * 100, 4)
+    }
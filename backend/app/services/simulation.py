@@ -0,0 +1,121 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# Путей в одном куске: 5000 × 1000 сделок × 8 байт ≈ 40 МБ на кусок
+CHUNK_PATHS = 5000
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def r_multiples(trades: Iterable[Dict]) -> np.ndarray:
+    """
+    R-мультипликаторы закрытых сделок: result / risk_amount
+
+    То же отношение, что Trade.risk_reward_ratio, но со знаком -
+    убыточные сделки дают отрицательный R.
+    """
+    values = [
+        float(trade["result"]) / float(trade["risk_amount"])
+        for trade in trades
+        if trade.get("result") is not None and trade.get("risk_amount")
+    ]
+    return np.asarray(values, dtype=np.float64)
+
+
+def simulate_chunk(
+    r: np.ndarray,
+    risk_fraction: float,
+    n_paths: int,
+    n_trades: int,
+    ruin_level: float,
+    seed: np.random.SeedSequence
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Кусок путей капитала (баланс нормирован к 1)
+
+    Размер позиции каждый раз считается от текущего баланса, поэтому
+    путь - накопленное произведение множителей 1 + риск × R.
+
+    Returns:
+        Итоговый баланс, максимальная просадка (доля) и признак разорения по путям
+    """
+    rng = np.random.default_rng(seed)
+    samples = r[rng.integers(0, len(r), size=(n_paths, n_trades))]
+    factors = np.maximum(1.0 + risk_fraction * samples, 0.0)
+    balance = np.cumprod(factors, axis=1)
+
+    peak = np.maximum(np.maximum.accumulate(balance, axis=1), 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_drawdown = np.max(1.0 - balance / peak, axis=1)
+    ruined = balance.min(axis=1) <= ruin_level
+
+    return balance[:, -1], max_drawdown, ruined
+
+
+def monte_carlo(
+    r: np.ndarray,
+    initial_balance: float,
+    risk_percentage: float,
+    n_paths: int = 10000,
+    n_trades: int = 250,
+    ruin_threshold_pct: float = 50.0,
+    seed: Optional[int] = None,
+    workers: int = 1
+) -> Dict:
+    """
+    Bootstrap-симуляция риска разорения по историческим R-мультипликаторам
+
+    Пути генерируются векторно кусками по CHUNK_PATHS; при workers > 1
+    куски считаются в пуле процессов. У каждого куска свой поток
+    случайных чисел из SeedSequence, поэтому результат с seed
+    воспроизводим при любом числе воркеров.
+
+    Args:
+        r: R-мультипликаторы сделок
+        initial_balance: Стартовый баланс
+        risk_percentage: Процент риска на сделку
+        n_paths: Число путей
+        n_trades: Сделок в пути
+        ruin_threshold_pct: Разорение - падение баланса до этого % от стартового
+        seed: Зерно генератора
+        workers: Число процессов
+
+    Returns:
+        Распределения итогового баланса и максимальной просадки, вероятность разорения
+    """
+    risk_fraction = risk_percentage / 100
+    ruin_level = ruin_threshold_pct / 100
+    sizes = [min(CHUNK_PATHS, n_paths - start) for start in range(0, n_paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(r, risk_fraction, size, n_trades, ruin_level, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    if workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks: List = list(pool.map(simulate_chunk, *zip(*args)))
+    else:
+        chunks = [simulate_chunk(*chunk_args) for chunk_args in args]
+
+    final = np.concatenate([chunk[0] for chunk in chunks]) * initial_balance
+    drawdown = np.concatenate([chunk[1] for chunk in chunks]) * 100
+    ruined = np.concatenate([chunk[2] for chunk in chunks])
+
+    def distribution(values: np.ndarray) -> Dict:
+        return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+    return {
+        "paths": n_paths,
+        "trades_per_path": n_trades,
+        "risk_percentage": risk_percentage,
+        "ruin_threshold_pct": ruin_threshold_pct,
+        "sample_size": len(r),
+        "mean_r": round(float(r.mean()), 4),
+        "final_balance": {
+            "mean": round(float(final.mean()), 2),
+            **distribution(final)
+        },
+        "max_drawdown_pct": distribution(drawdown),
+        "probability_of_profit": round(float((final > initial_balance).mean()), 4),
+        "probability_of_ruin": round(float(ruined.mean()), 4)
+    }
@@ -0,0 +1,170 @@
+from decimal import Decimal
+from typing import Iterable, Optional
+
+
+ZERO = Decimal("0")
+
+
+def trade_result(trade) -> Optional[Decimal]:
+    """Результат сделки из ORM-объекта или строки PostgREST (dict)"""
+    result = trade.get("result") if isinstance(trade, dict) else trade.result
+    if result is None:
+        return None
+    return result if isinstance(result, Decimal) else Decimal(str(result))
+
+
+class _Streak:
+    """
+    Серии подряд идущих сделок одного исхода (выигрыши или убытки).
+
+    Хранит длину серии в начале и в конце куска, максимум внутри и
+    число сделок - этого достаточно, чтобы склеивать соседние куски.
+    """
+
+    __slots__ = ("length", "prefix", "suffix", "longest")
+
+    def __init__(self):
+        self.length = 0
+        self.prefix = 0
+        self.suffix = 0
+        self.longest = 0
+
+    def push(self, hit: bool):
+        if hit:
+            if self.prefix == self.length:
+                self.prefix += 1
+            self.suffix += 1
+            self.longest = max(self.longest, self.suffix)
+        else:
+            self.suffix = 0
+        self.length += 1
+
+    def merge(self, other: "_Streak") -> "_Streak":
+        merged = _Streak()
+        merged.length = self.length + other.length
+        merged.prefix = self.prefix if self.prefix < self.length else self.length + other.prefix
+        merged.suffix = other.suffix if other.suffix < other.length else other.length + self.suffix
+        merged.longest = max(self.longest, other.longest, self.suffix + other.prefix)
+        return merged
+
+
+class TradeStatistics:
+    """
+    Потоковый аккумулятор статистики сделок
+
+    Сделки подаются по одной (или итератором) в хронологическом порядке,
+    память O(1), один проход. Результаты по последовательным кускам истории
+    склеиваются через merge(), поэтому историю можно читать постранично
+    из базы или считать частями в разных воркерах.
+
+    Просадка считается в долларах по накопленному P&L закрытых сделок.
+    """
+
+    __slots__ = (
+        "total_trades", "winning_trades", "losing_trades",
+        "total_profit", "total_loss", "largest_win", "largest_loss",
+        "wins", "losses", "cumulative", "peak", "trough", "max_drawdown"
+    )
+
+    def __init__(self):
+        self.total_trades = 0
+        self.winning_trades = 0
+        self.losing_trades = 0
+        self.total_profit = ZERO
+        self.total_loss = ZERO
+        self.largest_win = ZERO
+        self.largest_loss = ZERO
+        self.wins = _Streak()
+        self.losses = _Streak()
+        # Накопленный P&L относительно начала куска, его максимум и минимум
+        self.cumulative = ZERO
+        self.peak = ZERO
+        self.trough = ZERO
+        self.max_drawdown = ZERO
+
+    @classmethod
+    def from_trades(cls, trades: Iterable) -> "TradeStatistics":
+        return cls().update(trades)
+
+    @property
+    def completed_trades(self) -> int:
+        return self.wins.length
+
+    def add(self, trade) -> "TradeStatistics":
+        """Учитывает одну сделку (объект с полем result или dict)"""
+        self.total_trades += 1
+        result = trade_result(trade)
+        if result is None:
+            return self
+
+        self.wins.push(result > 0)
+        self.losses.push(result < 0)
+
+        if result > 0:
+            self.winning_trades += 1
+            self.total_profit += result
+            self.largest_win = max(self.largest_win, result)
+        elif result < 0:
+            self.losing_trades += 1
+            self.total_loss += result
+            self.largest_loss = min(self.largest_loss, result)
+
+        self.cumulative += result
+        if self.cumulative > self.peak:
+            self.peak = self.cumulative
+        elif self.cumulative < self.trough:
+            self.trough = self.cumulative
+        self.max_drawdown = max(self.max_drawdown, self.peak - self.cumulative)
+        return self
+
+    def update(self, trades: Iterable) -> "TradeStatistics":
+        for trade in trades:
+            self.add(trade)
+        return self
+
+    def merge(self, other: "TradeStatistics") -> "TradeStatistics":
+        """Склеивает статистику: self - более ранний кусок истории, other - следующий"""
+        merged = TradeStatistics()
+        merged.total_trades = self.total_trades + other.total_trades
+        merged.winning_trades = self.winning_trades + other.winning_trades
+        merged.losing_trades = self.losing_trades + other.losing_trades
+        merged.total_profit = self.total_profit + other.total_profit
+        merged.total_loss = self.total_loss + other.total_loss
+        merged.largest_win = max(self.largest_win, other.largest_win)
+        merged.largest_loss = min(self.largest_loss, other.largest_loss)
+        merged.wins = self.wins.merge(other.wins)
+        merged.losses = self.losses.merge(other.losses)
+        merged.cumulative = self.cumulative + other.cumulative
+        merged.peak = max(self.peak, self.cumulative + other.peak)
+        merged.trough = min(self.trough, self.cumulative + other.trough)
+        merged.max_drawdown = max(
+            self.max_drawdown,
+            other.max_drawdown,
+            self.peak - (self.cumulative + other.trough)
+        )
+        return merged
+
+    def as_dict(self) -> dict:
+        """Статистика в формате TradingCalculator.calculate_portfolio_statistics"""
+        completed = self.completed_trades
+        net_pnl = self.total_profit + self.total_loss
+
+        return {
+            "total_trades": self.total_trades,
+            "completed_trades": completed,
+            "winning_trades": self.winning_trades,
+            "losing_trades": self.losing_trades,
+            "win_rate": round(Decimal(self.winning_trades) * 100 / completed, 2) if completed else ZERO,
+            "total_profit": self.total_profit,
+            "total_loss": self.total_loss,
+            "net_pnl": net_pnl,
+            "largest_win": self.largest_win,
+            "largest_loss": self.largest_loss,
+            "average_win": self.total_profit / self.winning_trades if self.winning_trades else ZERO,
+            "average_loss": self.total_loss / self.losing_trades if self.losing_trades else ZERO,
+            "profit_factor": self.total_profit / -self.total_loss if self.total_loss else None,
+            "expectancy": net_pnl / completed if completed else ZERO,
+            "max_consecutive_wins": self.wins.longest,
+            "max_consecutive_losses": self.losses.longest,
+            "max_drawdown": self.max_drawdown
+        }
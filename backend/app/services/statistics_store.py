@@ -0,0 +1,190 @@
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from .statistics import ZERO, TradeStatistics, trade_result
+
+
+class PortfolioAggregates:
+    """
+    Агрегаты одного портфеля, которые можно обновлять дельтами
+
+    Суммы и счетчики обратимы, поэтому вставка, изменение и удаление
+    сделки стоят O(1). Для максимума/минимума хранится последний известный
+    result каждой сделки: пересчет по памяти нужен только когда удаляется
+    сама экстремальная сделка.
+    """
+
+    __slots__ = (
+        "results", "winning_trades", "losing_trades", "completed_trades",
+        "total_profit", "total_loss", "largest_win", "largest_loss"
+    )
+
+    def __init__(self):
+        self.results: Dict[str, Optional[Decimal]] = {}
+        self.winning_trades = 0
+        self.losing_trades = 0
+        self.completed_trades = 0
+        self.total_profit = ZERO
+        self.total_loss = ZERO
+        self.largest_win = ZERO
+        self.largest_loss = ZERO
+
+    def add(self, trade_id: str, result: Optional[Decimal]):
+        self.results[trade_id] = result
+        if result is None:
+            return
+        self.completed_trades += 1
+        if result > 0:
+            self.winning_trades += 1
+            self.total_profit += result
+            self.largest_win = max(self.largest_win, result)
+        elif result < 0:
+            self.losing_trades += 1
+            self.total_loss += result
+            self.largest_loss = min(self.largest_loss, result)
+
+    def remove(self, trade_id: str):
+        result = self.results.pop(trade_id, None)
+        if result is None:
+            return
+        self.completed_trades -= 1
+        if result > 0:
+            self.winning_trades -= 1
+            self.total_profit -= result
+            if result == self.largest_win:
+                self.largest_win = max((r for r in self.results.values() if r is not None and r > 0), default=ZERO)
+        elif result < 0:
+            self.losing_trades -= 1
+            self.total_loss -= result
+            if result == self.largest_loss:
+                self.largest_loss = min((r for r in self.results.values() if r is not None and r < 0), default=ZERO)
+
+    def as_dict(self) -> dict:
+        """Поля TradeStatistics.as_dict, не зависящие от порядка сделок"""
+        completed = self.completed_trades
+        net_pnl = self.total_profit + self.total_loss
+
+        return {
+            "total_trades": len(self.results),
+            "completed_trades": completed,
+            "winning_trades": self.winning_trades,
+            "losing_trades": self.losing_trades,
+            "win_rate": round(Decimal(self.winning_trades) * 100 / completed, 2) if completed else ZERO,
+            "total_profit": self.total_profit,
+            "total_loss": self.total_loss,
+            "net_pnl": net_pnl,
+            "largest_win": self.largest_win,
+            "largest_loss": self.largest_loss,
+            "average_win": self.total_profit / self.winning_trades if self.winning_trades else ZERO,
+            "average_loss": self.total_loss / self.losing_trades if self.losing_trades else ZERO,
+            "profit_factor": self.total_profit / -self.total_loss if self.total_loss else None,
+            "expectancy": net_pnl / completed if completed else ZERO
+        }
+
+
+class PortfolioStatisticsStore:
+    """
+    Хранилище статистики портфелей в памяти процесса, обновляемое при записи сделок
+
+    Работает как триггер update_portfolio_balance в supabase_setup.sql:
+    insert добавляет результат, update применяет дельту old → new, delete
+    вычитает. Портфель, которого нет в хранилище, заполняется через
+    rebuild() (холодный старт), пока его нет - записи по нему игнорируются.
+
+    Серии и просадка зависят от порядка сделок и здесь не хранятся -
+    их дает полный пересчет TradeStatistics.
+    """
+
+    def __init__(self):
+        self._portfolios: Dict[str, PortfolioAggregates] = {}
+        # Счетчик записей по портфелю: rebuild не сохраняет результат,
+        # если во время чтения истории пришли новые записи
+        self._versions: Dict[str, int] = {}
+
+    def version(self, portfolio_id: str) -> int:
+        return self._versions.get(str(portfolio_id), 0)
+
+    def get(self, portfolio_id: str) -> Optional[dict]:
+        aggregates = self._portfolios.get(str(portfolio_id))
+        return aggregates.as_dict() if aggregates is not None else None
+
+    def invalidate(self, portfolio_id: str):
+        portfolio_id = str(portfolio_id)
+        self._versions[portfolio_id] = self.version(portfolio_id) + 1
+        self._portfolios.pop(portfolio_id, None)
+
+    def rebuild(self, portfolio_id: str, trades: Iterable, version: Optional[int] = None) -> dict:
+        """
+        Строит агрегаты портфеля заново по полной истории сделок
+
+        version - значение version() до начала чтения истории; если с тех пор
+        были записи, результат возвращается, но не сохраняется.
+        """
+        portfolio_id = str(portfolio_id)
+        aggregates = PortfolioAggregates()
+        for trade in trades:
+            aggregates.add(str(trade["id"]), trade_result(trade))
+
+        if version is None or version == self.version(portfolio_id):
+            self._portfolios[portfolio_id] = aggregates
+        return aggregates.as_dict()
+
+    def apply_insert(self, trade: dict):
+        portfolio_id = str(trade["portfolio_id"])
+        self._versions[portfolio_id] = self.version(portfolio_id) + 1
+        aggregates = self._portfolios.get(portfolio_id)
+        if aggregates is not None:
+            aggregates.add(str(trade["id"]), trade_result(trade))
+
+    def apply_delete(self, trade: dict):
+        portfolio_id = str(trade["portfolio_id"])
+        self._versions[portfolio_id] = self.version(portfolio_id) + 1
+        aggregates = self._portfolios.get(portfolio_id)
+        if aggregates is not None:
+            aggregates.remove(str(trade["id"]))
+
+    def apply_update(self, new_trade: dict, old_trade: Optional[dict] = None):
+        """
+        Применяет дельту изменения сделки
+
+        Если старая версия не передана, берется последний известный result
+        этой сделки; сделку, неизвестную хранилищу, учесть нельзя - портфель
+        сбрасывается и пересоберется при следующем чтении.
+        """
+        trade_id = str(new_trade["id"])
+        portfolio_id = str(new_trade["portfolio_id"])
+
+        if old_trade is not None and str(old_trade["portfolio_id"]) != portfolio_id:
+            self.apply_delete(old_trade)
+            self.apply_insert(new_trade)
+            return
+
+        self._versions[portfolio_id] = self.version(portfolio_id) + 1
+        aggregates = self._portfolios.get(portfolio_id)
+        if aggregates is None:
+            return
+        if old_trade is None and trade_id not in aggregates.results:
+            self.invalidate(portfolio_id)
+            return
+
+        aggregates.remove(trade_id)
+        aggregates.add(trade_id, trade_result(new_trade))
+
+    def check_consistency(self, portfolio_id: str, trades: Iterable) -> dict:
+        """
+        Сверяет агрегаты с полным пересчетом TradeStatistics
+
+        Returns:
+            {"consistent": bool, "mismatches": {поле: {"cached", "expected"}}}
+        """
+        cached = self.get(portfolio_id)
+        expected = TradeStatistics.from_trades(trades).as_dict()
+        if cached is None:
+            return {"consistent": False, "mismatches": {}, "cached": False}
+
+        mismatches = {
+            field: {"cached": value, "expected": expected[field]}
+            for field, value in cached.items()
+            if expected[field] != value
+        }
+        return {"consistent": not mismatches, "mismatches": mismatches, "cached": True}
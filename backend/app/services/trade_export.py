@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, List
+
+
+# Колонки таблицы trades в порядке supabase_setup.sql
+TRADE_COLUMNS = [
+    "id", "portfolio_id", "user_id", "trade_date", "instrument", "timeframe",
+    "risk_amount", "stop_loss_points", "lot_size", "account_type", "direction",
+    "result", "notes", "created_at", "updated_at"
+]
+NUMERIC_COLUMNS = {"risk_amount", "stop_loss_points", "lot_size", "result"}
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+
+async def export_csv(pages: AsyncIterator[List[Dict]]) -> AsyncIterator[bytes]:
+    """CSV: заголовок сразу, затем по одному куску на страницу сделок"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TRADE_COLUMNS)
+    yield buffer.getvalue().encode()
+
+    async for page in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([row.get(column) for column in TRADE_COLUMNS] for row in page)
+        yield buffer.getvalue().encode()
+
+
+async def export_ndjson(pages: AsyncIterator[List[Dict]]) -> AsyncIterator[bytes]:
+    async for page in pages:
+        if page:
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in page).encode()
+
+
+async def export_parquet(pages: AsyncIterator[List[Dict]]) -> AsyncIterator[bytes]:
+    """Parquet: каждая страница - отдельная row group, байты отдаются по мере записи"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (column, pa.float64() if column in NUMERIC_COLUMNS else pa.string())
+        for column in TRADE_COLUMNS
+    ])
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    try:
+        async for page in pages:
+            if not page:
+                continue
+            columns = {
+                column: [
+                    (float(row[column]) if row.get(column) is not None else None) if column in NUMERIC_COLUMNS
+                    else (str(row[column]) if row.get(column) is not None else None)
+                    for row in page
+                ]
+                for column in TRADE_COLUMNS
+            }
+            writer.write_table(pa.table(columns, schema=schema))
+            data = drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield drain()
+
+
+EXPORTERS = {
+    "csv": export_csv,
+    "ndjson": export_ndjson,
+    "parquet": export_parquet
+}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
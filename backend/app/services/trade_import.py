@@ -0,0 +1,167 @@
+import csv
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+
+# Сколько отклоненных строк отдавать подробно; остальные только считаются
+MAX_REJECTS = 1000
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Разбивает поток байтов на строки, не читая тело целиком"""
+    buffer = b""
+    first = True
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig" if first else "utf-8") + "\n"
+            first = False
+    if buffer:
+        yield buffer.decode("utf-8-sig" if first else "utf-8")
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Записи загружаемого файла: (номер строки, данные, ошибка разбора)
+
+    CSV - первая строка заголовок, пустые значения считаются null;
+    запись в кавычках может занимать несколько строк файла.
+    NDJSON - один JSON-объект на строку.
+    """
+    header = None
+    pending = ""
+    line_no = 0
+
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if fmt == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"Некорректный JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "Ожидается JSON-объект"
+                continue
+            yield line_no, record, None
+            continue
+
+        # Запись CSV закончена, когда кавычки сбалансированы
+        pending += line
+        if pending.count('"') % 2:
+            continue
+        text, pending = pending, ""
+        if not text.strip():
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+
+        if len(values) != len(header):
+            yield line_no, None, f"Ожидается {len(header)} колонок, получено {len(values)}"
+            continue
+        yield line_no, {name: value if value != "" else None for name, value in zip(header, values)}, None
+
+    if pending.strip():
+        yield line_no, None, "Незакрытые кавычки в конце файла"
+
+
+class TradeImporter:
+    """
+    Потоковый импорт сделок пакетами
+
+    Строки проверяются моделью, валидные копятся в пакет и отправляются
+    одним массивным INSERT по достижении batch_size. В памяти держится
+    только текущий пакет и не больше MAX_REJECTS ошибок, поэтому память
+    не зависит от размера файла. progress обновляется по ходу импорта.
+    """
+
+    def __init__(
+        self,
+        model: type,
+        insert: Callable[[List[Dict]], Awaitable[Dict]],
+        batch_size: int = 1000
+    ):
+        self.model = model
+        self.insert = insert
+        self.batch_size = batch_size
+        self.portfolio_ids = set()
+        self.rejects: List[Dict] = []
+        self.progress = {
+            "status": "running",
+            "rows_read": 0,
+            "rows_inserted": 0,
+            "rows_rejected": 0,
+            "batches": 0,
+            "started_at": time.time(),
+            "finished_at": None
+        }
+
+    def reject(self, line: int, detail):
+        self.progress["rows_rejected"] += 1
+        if len(self.rejects) < MAX_REJECTS:
+            self.rejects.append({"line": line, "detail": detail})
+
+    async def flush(self, batch: List[Dict], lines: List[int]):
+        """
+        Вставляет пакет; если хранилище его отклонило, делит пополам
+
+        Массовый INSERT атомарен: одна плохая строка (несуществующий
+        portfolio_id, нарушение ограничения) отклоняет весь пакет. Половины
+        повторяются, пока ошибка не сузится до одной строки - она и
+        попадает в rejects, остальные строки пакета вставляются.
+        """
+        if not batch:
+            return
+        result = await self.insert(batch)
+        self.progress["batches"] += 1
+        if result['error']:
+            if len(batch) == 1:
+                self.reject(lines[0], result['error'])
+                return
+            middle = len(batch) // 2
+            await self.flush(batch[:middle], lines[:middle])
+            await self.flush(batch[middle:], lines[middle:])
+            return
+        self.progress["rows_inserted"] += len(batch)
+        self.portfolio_ids.update(row["portfolio_id"] for row in batch)
+
+    async def run(self, chunks: AsyncIterator[bytes], fmt: str) -> Dict:
+        batch: List[Dict] = []
+        lines: List[int] = []
+
+        try:
+            async for line, record, error in iter_records(chunks, fmt):
+                self.progress["rows_read"] += 1
+                if error:
+                    self.reject(line, error)
+                    continue
+                try:
+                    trade: BaseModel = self.model(**record)
+                except ValidationError as e:
+                    self.reject(line, e.errors(include_url=False, include_context=False, include_input=False))
+                    continue
+
+                batch.append(trade.model_dump(mode="json"))
+                lines.append(line)
+                if len(batch) >= self.batch_size:
+                    await self.flush(batch, lines)
+                    batch, lines = [], []
+
+            await self.flush(batch, lines)
+            self.progress["status"] = "completed"
+        except Exception:
+            self.progress["status"] = "failed"
+            raise
+        finally:
+            self.progress["finished_at"] = time.time()
+
+        return {**self.progress, "rejects": self.rejects}
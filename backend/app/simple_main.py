@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
+from .services.calculator import TradingCalculator
+
 # Создаем приложение
 app = FastAPI(
     title="Trading Portfolio Manager",
@@ -47,12 +49,12 @@ async def calculate_lot(risk: float, stop_loss: float):
     if risk <= 0 or stop_loss <= 0:
         return {"error": "Риск и стоп-лосс должны быть больше 0"}
     
-    lot_size = risk / stop_loss / 10
+    lot_size = float(TradingCalculator.calculate_lot_size(risk, stop_loss))
     
     return {
         "risk": risk,
         "stop_loss": stop_loss,
-        "lot_size": round(lot_size, 4),
+        "lot_size": lot_size,
         "formula": "lot = risk ÷ stop_loss ÷ 10"
     }
 
@@ -67,12 +69,12 @@ async def calculate_risk(balance: float, risk_percentage: float = 0.5):
     if balance <= 0 or risk_percentage <= 0:
         return {"error": "Баланс и процент риска должны быть больше 0"}
     
-    risk_amount = (balance * risk_percentage) / 100
+    risk_amount = float(TradingCalculator.calculate_risk_amount(balance, risk_percentage))
     
     return {
         "balance": balance,
         "risk_percentage": risk_percentage,
-        "risk_amount": round(risk_amount, 2),
+        "risk_amount": risk_amount,
         "formula": f"risk = {balance} × {risk_percentage}% = {risk_amount:.2f}"
     }
 
@@ -89,11 +91,9 @@ async def full_calculation(
     if balance <= 0 or risk_percentage <= 0 or stop_loss <= 0:
         return {"error": "Все значения должны быть больше 0"}
     
-    # Шаг 1: Рассчитываем риск
-    risk_amount = (balance * risk_percentage) / 100
-    
-    # Шаг 2: Рассчитываем лот
-    lot_size = risk_amount / stop_loss / 10
+    # Риск, затем лот от уже округленного риска - как в TradingCalculator
+    risk_amount, lot_size = TradingCalculator.calculate_trade_data(balance, risk_percentage, stop_loss)
+    risk_amount, lot_size = float(risk_amount), float(lot_size)
     
     return {
         "input": {
@@ -102,8 +102,8 @@ async def full_calculation(
             "stop_loss": stop_loss
         },
         "calculation": {
-            "risk_amount": round(risk_amount, 2),
-            "lot_size": round(lot_size, 4)
+            "risk_amount": risk_amount,
+            "lot_size": lot_size
         },
         "steps": [
             f"1. Риск = {balance} × {risk_percentage}% = {risk_amount:.2f} USD",
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов
+
+    Первый вызов do(key, ...) запускает запрос отдельной задачей, остальные
+    с тем же ключом, пришедшие до его завершения, ждут ту же задачу и
+    получают тот же результат (или исключение). Завершенные запросы не
+    хранятся, поэтому устаревания нет: следующий вызов идет в хранилище.
+    Задача не отменяется вместе с первым вызвавшим - ее ждут остальные.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable], on_coalesced: Callable[[], None] = None):
+        flight = self._flights.get(key)
+        if flight is None:
+            self.leaders += 1
+            flight = asyncio.ensure_future(fetch())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+            if on_coalesced is not None:
+                on_coalesced()
+        return await asyncio.shield(flight)
+
+    def _finish(self, key: Hashable, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Исключение забирают ожидающие; без них asyncio предупредил бы о нем
+        if not flight.cancelled():
+            flight.exception()
+
+    def forget(self, predicate: Callable[[Hashable], bool]):
+        """
+        Новые вызовы по ключам, подходящим под predicate, пойдут в хранилище
+
+        Нужно после записи: чтение, начатое до нее, может вернуть старые
+        данные и не должно доставаться тем, кто читает уже после записи.
+        """
+        for key in [key for key in self._flights if predicate(key)]:
+            del self._flights[key]
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
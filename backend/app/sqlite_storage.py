@@ -0,0 +1,383 @@
+import asyncio
+import enum
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import DDL, DateTime, and_, case, create_engine, delete, event, func, insert, or_, update
+from sqlalchemy import select as sql_select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import StaticPool
+
+from .database import Base, StorageBackend
+from .services.calculator import MONEY, quantize
+from .metrics import upstream_call
+from .models import User, Portfolio, Trade  # noqa: F401 - регистрация таблиц в Base.metadata
+
+
+# Аналог update_portfolio_balance из supabase_setup.sql. В SQLite нет триггеров
+# уровня оператора и таблиц переходов, поэтому здесь триггеры построчные
+BALANCE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trades_balance_insert AFTER INSERT ON trades
+    BEGIN
+        UPDATE portfolios SET balance = balance + COALESCE(NEW.result, 0), updated_at = CURRENT_TIMESTAMP
+        WHERE id = NEW.portfolio_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trades_balance_update AFTER UPDATE ON trades
+    BEGIN
+        UPDATE portfolios SET balance = balance - COALESCE(OLD.result, 0) + COALESCE(NEW.result, 0), updated_at = CURRENT_TIMESTAMP
+        WHERE id = NEW.portfolio_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trades_balance_delete AFTER DELETE ON trades
+    BEGIN
+        UPDATE portfolios SET balance = balance - COALESCE(OLD.result, 0), updated_at = CURRENT_TIMESTAMP
+        WHERE id = OLD.portfolio_id;
+    END
+    """
+]
+
+for trigger in BALANCE_TRIGGERS:
+    event.listen(Trade.__table__, "after_create", DDL(trigger).execute_if(dialect="sqlite"))
+
+
+def _to_json(value):
+    """Значения строк в том виде, в каком их отдает PostgREST"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _coerce(column, value):
+    """Строковое значение фильтра/курсора в тип колонки"""
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if isinstance(value, python_type):
+        return value
+    if python_type is uuid.UUID:
+        return uuid.UUID(str(value))
+    if python_type is datetime:
+        return datetime.fromisoformat(str(value))
+    if python_type is date:
+        return date.fromisoformat(str(value))
+    if python_type is Decimal:
+        return Decimal(str(value))
+    if issubclass(python_type, enum.Enum):
+        return python_type(value)
+    return python_type(value)
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Локальное хранилище на SQLite поверх SQLAlchemy-моделей
+
+    Повторяет поведение Supabase: тот же формат ответов, триггер баланса,
+    keyset-пагинация. Режим WAL позволяет читать параллельно с записью.
+    Запросы синхронные и выполняются в пуле потоков, чтобы не блокировать
+    event loop.
+    """
+
+    def __init__(self, path: str = "risk.db"):
+        self.path = path
+        if path == ":memory:":
+            self.engine = create_engine(
+                "sqlite://",
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool
+            )
+        else:
+            self.engine = create_engine(
+                f"sqlite:///{path}",
+                connect_args={"check_same_thread": False, "timeout": 30}
+            )
+
+        @event.listens_for(self.engine, "connect")
+        def _pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+        Base.metadata.create_all(self.engine)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        """
+        Новые nullable-колонки моделей в базе, созданной раньше них
+
+        create_all не меняет существующие таблицы, а select('*') читает
+        все колонки модели.
+        """
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+                for column in table.columns:
+                    if column.name not in existing and column.nullable and column.server_default is None:
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+
+    def _table(self, name: str):
+        return Base.metadata.tables[name]
+
+    def _where(self, table, filters: Optional[Dict]) -> list:
+        return [table.c[name] == _coerce(table.c[name], value) for name, value in (filters or {}).items()]
+
+    def _sortable(self, column, value=None):
+        """
+        Колонка (или значение курсора) в виде, пригодном для сравнения
+
+        DateTime SQLite хранит строкой, и формат зависит от того, кто писал:
+        CURRENT_TIMESTAMP дает "2024-01-01 10:00:00", SQLAlchemy -
+        "2024-01-01 10:00:00.000000". Строки одной секунды сравниваются
+        неверно, поэтому сортировка и курсор идут через julianday().
+        """
+        if isinstance(column.type, DateTime):
+            return func.julianday(column if value is None else _coerce(column, value))
+        return column if value is None else _coerce(column, value)
+
+    def _keyset(self, table, order: List, after: Dict):
+        """Условие "строго после курсора" для составной сортировки"""
+        branches = []
+        for i, (column, descending) in enumerate(order):
+            equals = [self._sortable(table.c[prev]) == self._sortable(table.c[prev], after[prev]) for prev, _ in order[:i]]
+            key, value = self._sortable(table.c[column]), self._sortable(table.c[column], after[column])
+            condition = key < value if descending else key > value
+            branches.append(and_(*equals, condition))
+        return or_(*branches)
+
+    def _rows(self, result) -> List[Dict]:
+        return [{key: _to_json(value) for key, value in row._mapping.items()} for row in result]
+
+    async def _run(self, table: str, verb: str, work) -> Dict:
+        with upstream_call(table, verb) as call:
+            try:
+                return {'data': await asyncio.to_thread(work), 'error': None}
+            except (SQLAlchemyError, ValueError, KeyError) as e:
+                call.error = True
+                return {'data': None, 'error': str(e)}
+
+    async def _write(self, table: str, verb: str, work) -> Dict:
+        result = await self._run(table, verb, work)
+        return result['data'] if result['error'] is None else result
+
+    async def select(
+        self,
+        table: str,
+        select: str = '*',
+        filters: Optional[Dict] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Optional[Dict] = None,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        def work():
+            model = self._table(table)
+            columns = list(model.c) if select == '*' else [model.c[name] for name in dict.fromkeys(select.split(','))]
+            query = sql_select(*columns).where(*self._where(model, filters))
+
+            if order:
+                parsed = []
+                for part in order.split(','):
+                    column, _, direction = part.partition('.')
+                    parsed.append((column, direction.startswith('desc')))
+                query = query.order_by(*[self._sortable(model.c[c]).desc() if d else self._sortable(model.c[c]).asc() for c, d in parsed])
+                if after:
+                    query = query.where(self._keyset(model, parsed, after))
+            if limit is not None:
+                query = query.limit(limit)
+            if offset:
+                query = query.offset(offset)
+
+            with self.engine.connect() as connection:
+                return self._rows(connection.execute(query))
+
+        result = await self._run(table, 'select', work)
+        if result['error']:
+            result['data'] = []
+        return result
+
+    def _written(self, rows: List[Dict], rowcount: int, returning: str, count: bool) -> Dict:
+        """Результат записи в формате AsyncSupabaseClient (returning/count)"""
+        result = {'data': rows if returning == 'representation' else True, 'error': None}
+        if count:
+            result['count'] = rowcount
+        return result
+
+    async def insert(
+        self,
+        table: str,
+        data: Union[Dict, List[Dict]],
+        returning: str = 'representation',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        def work():
+            model = self._table(table)
+            values = data if isinstance(data, list) else [data]
+            values = [{name: _coerce(model.c[name], value) for name, value in row.items()} for row in values]
+            with self.engine.begin() as connection:
+                if returning == 'minimal':
+                    connection.execute(insert(model), values)
+                    return self._written([], len(values), returning, count)
+                rows = self._rows(connection.execute(insert(model).returning(*model.c), values))
+                return self._written(rows, len(rows), returning, count)
+
+        return await self._write(table, 'insert', work)
+
+    async def update(
+        self,
+        table: str,
+        data: Dict,
+        filters: Dict,
+        returning: str = 'representation',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        def work():
+            model = self._table(table)
+            values = {name: _coerce(model.c[name], value) for name, value in data.items()}
+            query = update(model).where(*self._where(model, filters)).values(**values)
+            with self.engine.begin() as connection:
+                if returning == 'minimal':
+                    return self._written([], connection.execute(query).rowcount, returning, count)
+                rows = self._rows(connection.execute(query.returning(*model.c)))
+                return self._written(rows, len(rows), returning, count)
+
+        return await self._write(table, 'update', work)
+
+    async def delete(
+        self,
+        table: str,
+        filters: Dict,
+        returning: str = 'minimal',
+        count: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        def work():
+            model = self._table(table)
+            query = delete(model).where(*self._where(model, filters))
+            with self.engine.begin() as connection:
+                if returning == 'minimal':
+                    return self._written([], connection.execute(query).rowcount, returning, count)
+                rows = self._rows(connection.execute(query.returning(*model.c)))
+                return self._written(rows, len(rows), returning, count)
+
+        return await self._write(table, 'delete', work)
+
+    async def rpc(self, function: str, params: Optional[Dict] = None, timeout: Optional[float] = None) -> Dict:
+        """SQL-функции supabase_setup.sql, переписанные для SQLite"""
+        def work():
+            implementation = self.RPC.get(function)
+            if implementation is None:
+                raise ValueError(f"Неизвестная функция: {function}")
+            with self.engine.begin() as connection:
+                return implementation(self, connection, **(params or {}))
+
+        return await self._run(function, 'rpc', work)
+
+    def _trade_breakdown(self, connection, p_portfolio_id, p_group_by=("instrument", "timeframe", "month"), p_date_from=None, p_date_to=None) -> List[Dict]:
+        """Аналог trade_breakdown: агрегаты считает SQLite, производные - Decimal"""
+        trades = self._table('trades')
+        result = trades.c.result
+        dimensions = {
+            "instrument": trades.c.instrument,
+            "timeframe": trades.c.timeframe,
+            "month": func.strftime('%Y-%m-01', trades.c.trade_date)
+        }
+        unknown = set(p_group_by) - set(dimensions)
+        if unknown:
+            raise ValueError(f"Неизвестные измерения: {', '.join(sorted(unknown))}")
+        groups = [expression.label(name) for name, expression in dimensions.items() if name in p_group_by]
+
+        query = sql_select(
+            *groups,
+            func.count().label("total_trades"),
+            func.count(result).label("completed_trades"),
+            func.sum(case((result > 0, 1), else_=0)).label("winning_trades"),
+            func.sum(case((result < 0, 1), else_=0)).label("losing_trades"),
+            func.sum(case((result > 0, result), else_=0)).label("total_profit"),
+            func.sum(case((result < 0, result), else_=0)).label("total_loss"),
+            func.coalesce(func.sum(result), 0).label("net_pnl")
+        ).where(trades.c.portfolio_id == _coerce(trades.c.portfolio_id, p_portfolio_id))
+        if p_date_from is not None:
+            query = query.where(trades.c.trade_date >= _coerce(trades.c.trade_date, p_date_from))
+        if p_date_to is not None:
+            query = query.where(trades.c.trade_date <= _coerce(trades.c.trade_date, p_date_to))
+        if groups:
+            # Порядок как у trade_breakdown: месяц, затем инструмент и таймфрейм
+            query = query.group_by(*groups).order_by(*sorted(groups, key=lambda group: group.name != "month"))
+
+        rows = []
+        for row in connection.execute(query):
+            values = row._mapping
+            if not values["total_trades"]:
+                continue
+            money = {name: quantize(Decimal(str(values[name])), MONEY) for name in ("total_profit", "total_loss", "net_pnl")}
+            winning, losing, completed = values["winning_trades"], values["losing_trades"], values["completed_trades"]
+            rows.append({
+                **{name: values.get(name) for name in dimensions},
+                "total_trades": values["total_trades"],
+                "completed_trades": completed,
+                "winning_trades": winning,
+                "losing_trades": losing,
+                "win_rate": float(quantize(Decimal(winning * 100) / completed, MONEY)) if completed else 0.0,
+                **{name: float(value) for name, value in money.items()},
+                "average_win": float(quantize(money["total_profit"] / winning, MONEY)) if winning else 0.0,
+                "average_loss": float(quantize(money["total_loss"] / losing, MONEY)) if losing else 0.0
+            })
+        return rows
+
+    def _reconcile_portfolio_balances(self, connection, p_portfolio_id=None, p_fix=False) -> List[Dict]:
+        """Аналог reconcile_portfolio_balances: balance = initial_balance + сумма результатов"""
+        portfolios, trades = self._table('portfolios'), self._table('trades')
+        results = (
+            sql_select(func.coalesce(func.sum(trades.c.result), 0))
+            .where(trades.c.portfolio_id == portfolios.c.id)
+            .scalar_subquery()
+        )
+        query = sql_select(portfolios.c.id, portfolios.c.balance, portfolios.c.initial_balance, results.label("results")).order_by(portfolios.c.id)
+        if p_portfolio_id is not None:
+            query = query.where(portfolios.c.id == _coerce(portfolios.c.id, p_portfolio_id))
+
+        rows = []
+        for row in connection.execute(query):
+            stored = quantize(Decimal(str(row.balance)), MONEY)
+            expected = quantize(Decimal(str(row.initial_balance)) + Decimal(str(row.results)), MONEY)
+            fixed = bool(p_fix) and stored != expected
+            if fixed:
+                connection.execute(
+                    update(portfolios).where(portfolios.c.id == row.id).values(balance=expected)
+                )
+            rows.append({
+                "portfolio_id": _to_json(row.id),
+                "stored_balance": float(stored),
+                "expected_balance": float(expected),
+                "drift": float(expected - stored),
+                "fixed": fixed
+            })
+        return rows
+
+    RPC = {"trade_breakdown": _trade_breakdown, "reconcile_portfolio_balances": _reconcile_portfolio_balances}
+
+    async def aclose(self):
+        self.engine.dispose()
+
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, Set, Tuple
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+try:
+    import brotli
+except ImportError:  # brotli опционален: без него отдается gzip
+    brotli = None
+
+MEDIA_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+}
+# Имя с хэшем содержимого не меняется никогда - кэшируется на год;
+# остальные браузер перепроверяет по ETag при каждой загрузке
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Меньше этого сжатие не окупается
+MIN_COMPRESS_SIZE = 1024
+# Порядок предпочтения кодировок
+ENCODINGS = ("br", "gzip")
+
+REFERENCE = re.compile(r'(src|href)="([^"]+)"')
+
+
+def accepted_encodings(header: str) -> Set[str]:
+    """Кодировки из Accept-Encoding, кроме явно запрещенных q=0"""
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = params.strip().replace(" ", "")
+        if token and quality not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+class Asset:
+    """Файл, заранее сжатый во все поддерживаемые кодировки"""
+
+    __slots__ = ("media_type", "digest", "variants")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants: Dict[str, bytes] = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(body, quality=11)
+            self.variants.update({name: data for name, data in compressed.items() if len(data) < len(body)})
+
+    def etag(self, encoding: str) -> str:
+        """Сильный ETag: у каждого варианта кодировки свой"""
+        tag = self.digest[:32]
+        return f'"{tag}"' if encoding == "identity" else f'"{tag}-{encoding}"'
+
+    def negotiate(self, accept_encoding: str) -> str:
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return "identity"
+
+
+class StaticAssets:
+    """
+    Раздача фронтенда из явного списка файлов
+
+    При создании файлы читаются и сжимаются (gzip, brotli при наличии
+    пакета). JS/CSS доступны также по имени с хэшем содержимого
+    (script.3f2a9c1b0e.js) с Cache-Control: immutable; ссылки src/href в
+    HTML переписываются на эти имена. HTML отдается с no-cache и
+    перепроверяется по ETag (ответ 304 без тела). Файлы вне списка -
+    404, сколько бы их ни лежало в каталоге.
+    """
+
+    def __init__(self, directory: str, files: Iterable[str], index: str = "index.html"):
+        self.index = index
+        # имя -> (файл, Cache-Control)
+        self.files: Dict[str, Tuple[Asset, str]] = {}
+        self.hashed: Dict[str, str] = {}
+
+        bodies = {}
+        for name in files:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    bodies[name] = f.read()
+
+        for name, body in bodies.items():
+            stem, ext = os.path.splitext(name)
+            if ext == ".html":
+                continue
+            asset = Asset(body, MEDIA_TYPES.get(ext, "application/octet-stream"))
+            self.hashed[name] = f"{stem}.{asset.digest[:10]}{ext}"
+            self.files[name] = (asset, REVALIDATE)
+            self.files[self.hashed[name]] = (asset, IMMUTABLE)
+
+        for name, body in bodies.items():
+            if name.endswith(".html"):
+                html = REFERENCE.sub(self._rewrite, body.decode("utf-8")).encode("utf-8")
+                self.files[name] = (Asset(html, MEDIA_TYPES[".html"]), REVALIDATE)
+
+    def _rewrite(self, match) -> str:
+        attribute, target = match.groups()
+        return f'{attribute}="{self.hashed.get(target, target)}"'
+
+    def response(self, name: str, request: Request) -> Response:
+        """Ответ на запрос файла name с учетом Accept-Encoding и If-None-Match"""
+        entry = self.files.get(name or self.index)
+        if entry is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        asset, cache_control = entry
+        encoding = asset.negotiate(request.headers.get("accept-encoding", ""))
+        etag = asset.etag(encoding)
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if etag in candidates or "*" in candidates:
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(asset.variants[encoding], media_type=asset.media_type, headers=headers)
+
+    async def __call__(self, scope, receive, send):
+        """ASGI-приложение для app.mount(...)"""
+        request = Request(scope, receive)
+        if request.method not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            path, root = scope["path"], scope.get("root_path", "")
+            if root and path.startswith(root):
+                path = path[len(root):]
+            response = self.response(path.lstrip("/"), request)
+        await response(scope, receive, send)
@@ -0,0 +1,22 @@
+from typing import Optional
+
+from .config import settings
+from .database import StorageBackend, async_supabase
+
+
+def create_storage(backend: str = settings.STORAGE_BACKEND) -> Optional[StorageBackend]:
+    """
+    Хранилище, выбранное в настройках (STORAGE_BACKEND)
+
+    supabase - удаленный PostgREST (None, если не заданы ключи),
+    sqlite - локальная база SQLITE_PATH на SQLAlchemy-моделях.
+    """
+    if backend == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+        return SQLiteStorage(settings.SQLITE_PATH)
+    if backend == "supabase":
+        return async_supabase
+    raise ValueError(f"Неизвестное хранилище: {backend}")
+
+
+storage = create_storage()
@@ -0,0 +1,97 @@
+"""
+Сверка режимов TradingCalculator: EXACT (Decimal) и FAST (float/NumPy)
+
+Общий корпус входов - граничные случаи (половина кванта, дробные проценты,
+большие балансы, невалидные значения) и случайные входы с точностью
+колонок базы. Для каждого входа скалярные методы и calculate_lot_sizes_batch
+в обоих режимах должны дать одинаковые риск и лот.
+
+Запуск из backend/:
+    python -m benchmarks.agreement            # код выхода 1 при расхождениях
+    python -m benchmarks.agreement --random 100000
+"""
+import argparse
+import random
+import sys
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from app.services.calculator import EXACT, FAST, TradingCalculator
+
+# (баланс, процент риска, стоп-лосс)
+CASES: List[Tuple[str, str, str]] = [
+    ("10000", "0.5", "15"),
+    ("10000", "1", "20"),
+    ("25.00", "0.5", "1"),          # риск 0.125 -> 0.13 (половина цента)
+    ("1.00", "0.5", "10"),          # риск 0.005 -> 0.01
+    ("1.00", "0.25", "10"),         # риск 0.0025 -> 0.00
+    ("10.00", "0.1", "20"),         # лот 0.00005 -> 0.0001 (половина кванта лота)
+    ("3.33", "1.5", "7.77"),
+    ("999999999.99", "99.99", "0.01"),
+    ("12345.67", "0.33", "13.5"),
+    ("100.10", "2.5", "0.5"),
+    ("0.01", "0.01", "1"),          # риск меньше цента -> 0
+    ("5000", "0.75", "33.33"),
+    ("0", "0.5", "15"),             # невалидный баланс
+    ("10000", "0", "15"),           # невалидный процент
+    ("10000", "0.5", "0"),          # невалидный стоп
+    ("-100", "0.5", "15"),
+    ("10000", "0.5", "-5"),
+]
+
+
+def random_cases(count: int, seed: int = 7) -> List[Tuple[str, str, str]]:
+    """Случайные входы с 2 знаками после запятой, как в DECIMAL-колонках"""
+    rng = random.Random(seed)
+    return [
+        (f"{rng.randint(1, 10_000_000) / 100:.2f}", f"{rng.randint(1, 500) / 100:.2f}", f"{rng.randint(1, 50_000) / 100:.2f}")
+        for _ in range(count)
+    ]
+
+
+def check(cases: List[Tuple[str, str, str]]) -> List[str]:
+    """Расхождения между режимами; пустой список - режимы согласованы"""
+    mismatches = []
+    balances = [float(balance) for balance, _, _ in cases]
+    percentages = [float(percentage) for _, percentage, _ in cases]
+    stops = [float(stop) for _, _, stop in cases]
+    batches = {
+        mode: TradingCalculator.calculate_lot_sizes_batch(stops, balances=balances, risk_percentages=percentages, mode=mode)
+        for mode in (EXACT, FAST)
+    }
+
+    for index, (balance, percentage, stop) in enumerate(cases):
+        exact = TradingCalculator.calculate_trade_data(Decimal(balance), Decimal(percentage), Decimal(stop))
+        fast = TradingCalculator.calculate_trade_data(float(balance), float(percentage), float(stop), mode=FAST)
+        expected = (float(exact[0]), float(exact[1]))
+
+        results = {"fast": fast}
+        for mode, batch in batches.items():
+            if batch["valid"][index]:
+                results[f"batch.{mode}"] = (batch["risk_amount"][index], batch["lot_size"][index])
+        for name, (risk, lot) in results.items():
+            if (float(risk), float(lot)) != expected:
+                mismatches.append(f"{balance} × {percentage}% / {stop}: exact {expected}, {name} ({float(risk)}, {float(lot)})")
+
+        batch_errors = {error["index"] for error in batches[FAST]["errors"]}
+        exact_errors = {error["index"] for error in batches[EXACT]["errors"]}
+        if (index in batch_errors) != (index in exact_errors):
+            mismatches.append(f"{balance} × {percentage}% / {stop}: разная валидация в batch")
+    return mismatches
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Сверка режимов EXACT и FAST калькулятора")
+    parser.add_argument("--random", type=int, default=10000, help="Число случайных входов")
+    args = parser.parse_args(argv)
+
+    cases = CASES + random_cases(args.random)
+    mismatches = check(cases)
+    for line in mismatches[:50]:
+        print(line)
+    print(f"Входов: {len(cases)}, расхождений: {len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
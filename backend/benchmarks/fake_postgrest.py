@@ -0,0 +1,273 @@
+"""
+Локальная замена PostgREST для бенчмарков
+
+Отдает синтетические портфели и сделки по /rest/v1/{table} с заданной
+задержкой. Поддерживает то подмножество PostgREST, которым пользуется
+SupabaseClient: select, фильтры eq, order, limit/offset, keyset-фильтр or=(...)
+и заголовок Prefer: return=representation|minimal, count=exact.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+TRADE_ORDER = ("trade_date", "created_at", "id")
+RESERVED = {"select", "order", "limit", "offset", "or"}
+
+
+def generate_data(portfolios: int = 10, trades_per_portfolio: int = 10000, seed: int = 42) -> Dict[str, List[Dict]]:
+    """Синтетические портфели и сделки с правдоподобным распределением результатов"""
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    data = {"portfolios": [], "trades": []}
+
+    for p in range(portfolios):
+        portfolio_id = str(uuid.UUID(int=p + 1))
+        balance = 10000.0
+        for t in range(trades_per_portfolio):
+            risk_amount = round(balance * 0.005, 2)
+            r = rng.choice([-1.0, -1.0, -0.5, 0.0, 1.0, 1.5, 2.0, 3.0])
+            result = round(risk_amount * r, 2) if t < trades_per_portfolio - 5 else None
+            balance += result or 0
+            stop = rng.choice([10, 15, 20, 30])
+            day = start + timedelta(days=t // 5)
+            data["trades"].append({
+                "id": f"{p:04d}-{t:08d}",
+                "portfolio_id": portfolio_id,
+                "user_id": None,
+                "trade_date": day.isoformat(),
+                "instrument": rng.choice(["XAUUSD", "EURUSD", "GBPUSD", "US30"]),
+                "timeframe": rng.choice(["M15", "H1", "H4", "D1"]),
+                "risk_amount": risk_amount,
+                "stop_loss_points": stop,
+                "lot_size": round(risk_amount / stop / 10, 4),
+                "account_type": "Demo",
+                "direction": rng.choice(["buy", "sell"]),
+                "result": result,
+                "notes": "synthetic",
+                "created_at": datetime(day.year, day.month, day.day, 10, t % 5, tzinfo=timezone.utc).isoformat(),
+                "updated_at": None
+            })
+        data["portfolios"].append({
+            "id": portfolio_id,
+            "user_id": None,
+            "name": f"Portfolio {p}",
+            "balance": round(balance, 2),
+            "initial_balance": 10000.0,
+            "risk_percentage": 0.5,
+            "created_at": "2020-01-01T00:00:00+00:00",
+            "updated_at": "2020-01-01T00:00:00+00:00"
+        })
+    return data
+
+
+def _split_top(text: str) -> List[str]:
+    """Делит "a,and(b,c),d" по запятым верхнего уровня с учетом кавычек"""
+    parts, depth, quoted, current = [], 0, False, ""
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and quoted:
+            current += text[i:i + 2]
+            i += 2
+            continue
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            i += 1
+            continue
+        current += char
+        i += 1
+    parts.append(current)
+    return parts
+
+
+def _unquote(value: str) -> str:
+    if value.startswith('"') and value.endswith('"'):
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+def _condition(expression: str):
+    """Условие PostgREST (col.op.value или and(...)) в функцию от строки"""
+    if expression.startswith("and(") and expression.endswith(")"):
+        conditions = [_condition(part) for part in _split_top(expression[4:-1])]
+        return lambda row: all(condition(row) for condition in conditions)
+
+    column, op, value = expression.split(".", 2)
+    value = _unquote(value)
+    compare = {
+        "eq": lambda a, b: a == b,
+        "lt": lambda a, b: a < b,
+        "gt": lambda a, b: a > b
+    }[op]
+    return lambda row: row[column] is not None and compare(str(row[column]), value)
+
+
+class FakePostgrest:
+    """Состояние фейкового сервера: таблицы и задержка ответа"""
+
+    def __init__(self, data: Dict[str, List[Dict]], latency: float = 0.0):
+        self.latency = latency
+        self.tables = data
+        self.requests = 0
+        # Сделки портфеля, отсортированные в порядке keyset-пагинации
+        self.trades_by_portfolio: Dict[str, List[Dict]] = {}
+        for trade in data["trades"]:
+            self.trades_by_portfolio.setdefault(trade["portfolio_id"], []).append(trade)
+        for trades in self.trades_by_portfolio.values():
+            trades.sort(key=self._trade_key)
+        self.app = Starlette(routes=[Route("/rest/v1/{table}", self.handle, methods=["GET", "POST", "PATCH", "DELETE"])])
+
+    @staticmethod
+    def _trade_key(row: Dict):
+        return tuple(str(row[column]) for column in TRADE_ORDER)
+
+    def _query(self, table: str, params: List) -> List[Dict]:
+        filters = [(key, value[3:]) for key, value in params if key not in RESERVED and value.startswith("eq.")]
+        query = dict(params)
+        order = query.get("order")
+
+        if table == "trades" and len(filters) == 1 and filters[0][0] == "portfolio_id":
+            rows = self.trades_by_portfolio.get(filters[0][1], [])
+            presorted = True
+        else:
+            rows = [row for row in self.tables[table] if all(str(row.get(key)) == value for key, value in filters)]
+            presorted = False
+
+        descending = False
+        if order:
+            columns = [part.split(".") for part in order.split(",")]
+            descending = columns[0][1] == "desc"
+            if not (presorted and tuple(column for column, _ in columns) == TRADE_ORDER):
+                rows = sorted(rows, key=lambda row: tuple(str(row.get(column)) for column, _ in columns), reverse=descending)
+                presorted = False
+            elif descending:
+                rows = rows[::-1]
+
+        if "or" in query:
+            keyset = query["or"]
+            if presorted and order:
+                # Позиция курсора бинарным поиском по отсортированным ключам
+                cursor = tuple(_unquote(part.split(".", 2)[2]) for part in _split_top(_split_top(keyset[1:-1])[-1][4:-1]))
+                keys = [self._trade_key(row) for row in (rows[::-1] if descending else rows)]
+                if descending:
+                    rows = rows[len(keys) - bisect_left(keys, cursor):]
+                else:
+                    rows = rows[bisect_right(keys, cursor):]
+            else:
+                conditions = [_condition(part) for part in _split_top(keyset[1:-1])]
+                rows = [row for row in rows if any(condition(row) for condition in conditions)]
+
+        offset = int(query.get("offset", 0))
+        limit = query.get("limit")
+        rows = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+
+        select = query.get("select", "*")
+        if select != "*":
+            columns = select.split(",")
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return rows
+
+    async def handle(self, request: Request) -> Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        table = request.path_params["table"]
+        if table not in self.tables:
+            return Response(json.dumps({"message": f"relation {table} does not exist"}), status_code=404, media_type="application/json")
+
+        params = list(request.query_params.multi_items())
+        prefer = request.headers.get("prefer", "")
+        representation = "return=representation" in prefer
+
+        def written(rows: List[Dict], status: int) -> Response:
+            headers = {"Content-Range": f"*/{len(rows)}"} if "count=exact" in prefer else {}
+            if representation:
+                return Response(json.dumps(rows), status_code=status, media_type="application/json", headers=headers)
+            return Response(status_code=201 if status == 201 else 204, headers=headers)
+
+        if request.method == "GET":
+            return Response(json.dumps(self._query(table, params)), media_type="application/json")
+
+        if request.method == "POST":
+            payload = json.loads(await request.body())
+            rows = payload if isinstance(payload, list) else [payload]
+            for row in rows:
+                row.setdefault("id", str(uuid.uuid4()))
+                row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                self.tables[table].append(row)
+            return written(rows, 201)
+
+        matched = self._query(table, [param for param in params if param[0] != "select"])
+        if request.method == "PATCH":
+            changes = json.loads(await request.body())
+            for row in matched:
+                row.update(changes)
+            return written(matched, 200)
+
+        ids = {id(row) for row in matched}
+        self.tables[table] = [row for row in self.tables[table] if id(row) not in ids]
+        return written(matched, 200)
+
+
+class ServerThread:
+    """Фейковый PostgREST на uvicorn в фоновом потоке"""
+
+    def __init__(self, fake: FakePostgrest, host: str = "127.0.0.1", port: int = 8765):
+        import uvicorn
+
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(fake.app, host=host, port=port, log_level="warning", access_log=False))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "ServerThread":
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("Фейковый PostgREST не запустился")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def serve(portfolios: int = 10, trades_per_portfolio: int = 10000, latency: float = 0.0, port: int = 8765):
+    """Запуск фейкового сервера отдельно: python -m benchmarks.fake_postgrest"""
+    import uvicorn
+
+    fake = FakePostgrest(generate_data(portfolios, trades_per_portfolio), latency=latency)
+    uvicorn.run(fake.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Фейковый PostgREST с синтетическими данными")
+    parser.add_argument("--portfolios", type=int, default=10)
+    parser.add_argument("--trades", type=int, default=10000, help="Сделок на портфель")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    serve(args.portfolios, args.trades, args.latency_ms / 1000, args.port)
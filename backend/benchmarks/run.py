@@ -0,0 +1,317 @@
+"""
+Бенчмарки: калькулятор, маршруты API и клиент Supabase
+
+Запуск из backend/:
+    python -m benchmarks.run                       # полный прогон
+    python -m benchmarks.run --quick               # быстрый прогон
+    python -m benchmarks.run --save-baseline       # сохранить результат как базу
+    python -m benchmarks.run --threshold 0.2       # регрессия > 20% - код выхода 1
+
+Маршруты main.py гоняются через ASGI-транспорт httpx, хранилище - фейковый
+PostgREST (benchmarks/fake_postgrest.py) с настраиваемой задержкой.
+Замеряются все маршруты, кроме перечисленных в EXCLUDED_ROUTES (с причиной);
+маршрут без бенчмарка и без исключения печатается в конце прогона.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_OUTPUT = BENCH_DIR / "results.json"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+
+def summarize(samples: List[float], total: Optional[float] = None) -> Dict:
+    """Задержки в миллисекундах и пропускная способность"""
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        "count": count,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "p50_ms": round(ordered[count // 2] * 1000, 4),
+        "p99_ms": round(ordered[min(count - 1, int(count * 0.99))] * 1000, 4),
+        "ops_per_sec": round(count / (total if total is not None else sum(ordered)), 2)
+    }
+
+
+def measure(func: Callable, repeat: int) -> Dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def bench_calculator(quick: bool) -> Dict[str, Dict]:
+    from app.services.calculator import FAST, TradingCalculator
+
+    rng = random.Random(1)
+    results = {}
+
+    balance, percentage, stop = Decimal("10000"), Decimal("0.5"), Decimal("15")
+    results["calculator.calculate_trade_data"] = measure(
+        lambda: TradingCalculator.calculate_trade_data(balance, percentage, stop), 2000 if quick else 20000
+    )
+    results["calculator.calculate_trade_data.fast"] = measure(
+        lambda: TradingCalculator.calculate_trade_data(10000.0, 0.5, 15.0, mode=FAST), 2000 if quick else 20000
+    )
+
+    sizes = [10_000] if quick else [10_000, 1_000_000]
+    for size in sizes:
+        trades = [
+            SimpleNamespace(result=Decimal(rng.randint(-10000, 15000)) / 100 if rng.random() > 0.05 else None)
+            for _ in range(size)
+        ]
+        results[f"calculator.portfolio_statistics.{size}"] = measure(
+            lambda: TradingCalculator.calculate_portfolio_statistics(trades), 3 if size > 100_000 else 10
+        )
+
+    stops = [rng.uniform(5, 50) for _ in range(100_000)]
+    risks = [rng.uniform(10, 500) for _ in range(100_000)]
+    results["calculator.lot_sizes_batch.100000"] = measure(
+        lambda: TradingCalculator.calculate_lot_sizes_batch(stops, risk_amounts=risks), 10
+    )
+    return results
+
+
+# Маршруты main.py, которые не гоняются, и почему; остальные обязаны быть в bench_routes
+EXCLUDED_ROUTES = {
+    "GET /stream": "бесконечный поток SSE, задержка запроса не определена",
+    "GET /admin/profiles": "нужны PROFILING_SECRET и сохраненные профили",
+    "GET /admin/profiles/{profile_id}": "нужны PROFILING_SECRET и сохраненные профили",
+    "GET /admin/profiles/{profile_id}/download": "нужны PROFILING_SECRET и сохраненные профили",
+    "GET /portfolios/{portfolio_id}/breakdown": "rpc trade_breakdown, фейковый PostgREST не реализует rpc",
+    "POST /portfolios/{portfolio_id}/balance/recompute": "rpc reconcile_portfolio_balances, фейковый PostgREST не реализует rpc",
+}
+
+
+def uncovered_routes(app, covered) -> List[str]:
+    """Маршруты API, которых нет ни среди замеренных, ни в EXCLUDED_ROUTES"""
+    from fastapi.routing import APIRoute
+
+    names = {name.split("[")[0] for name in covered} | set(EXCLUDED_ROUTES)
+    return sorted(
+        f"{method} {route.path}"
+        for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods
+        if f"{method} {route.path}" not in names
+    )
+
+
+async def bench_routes(app, fake, requests_per_route: int, concurrency: int) -> Dict[str, Dict]:
+    import httpx
+
+    portfolio_id = fake.tables["portfolios"][0]["id"]
+    trade_id = fake.tables["trades"][0]["id"]
+    # Удаляемые сделки: последние сделки портфеля, по одной на запрос и прогрев
+    deleted_ids = iter([trade["id"] for trade in fake.tables["trades"][-(requests_per_route + 1):]])
+    batch = {
+        "stop_loss_points": [random.uniform(5, 50) for _ in range(1000)],
+        "risk_amount": [random.uniform(10, 500) for _ in range(1000)]
+    }
+    trade = {
+        "portfolio_id": portfolio_id, "instrument": "XAUUSD", "timeframe": "H1", "direction": "buy",
+        "risk_amount": 50, "stop_loss_points": 15, "lot_size": 0.3333
+    }
+    import_body = "".join(json.dumps({**trade, "result": 10}) + "\n" for _ in range(100)).encode()
+    # Тело: dict - JSON, bytes - как есть (NDJSON импорта); путь может зависеть от номера запроса
+    routes = [
+        ("GET /", "GET", "/", None),
+        ("GET /health", "GET", "/health", None),
+        ("GET /cache/stats", "GET", "/cache/stats", None),
+        ("GET /metrics", "GET", "/metrics", None),
+        ("POST /calculate-lot", "POST", "/calculate-lot", {"risk_amount": 50, "stop_loss_points": 15}),
+        ("POST /calculate-lot/batch[1000]", "POST", "/calculate-lot/batch", batch),
+        ("GET /portfolios", "GET", "/portfolios", None),
+        ("GET /portfolios/{portfolio_id}/risk-amount", "GET", f"/portfolios/{portfolio_id}/risk-amount", None),
+        ("GET /trades", "GET", f"/trades?portfolio_id={portfolio_id}&limit=50", None),
+        ("GET /trades[columns]", "GET", f"/trades?portfolio_id={portfolio_id}&limit=500&fields=id,trade_date,result&format=columns", None),
+        ("GET /portfolios/{portfolio_id}/statistics", "GET", f"/portfolios/{portfolio_id}/statistics", None),
+        ("GET /portfolios/{portfolio_id}/statistics/verify", "GET", f"/portfolios/{portfolio_id}/statistics/verify", None),
+        ("GET /portfolios/{portfolio_id}/equity-curve", "GET", f"/portfolios/{portfolio_id}/equity-curve?downsample=lttb", None),
+        ("GET /portfolios/{portfolio_id}/risk-sweep", "GET", f"/portfolios/{portfolio_id}/risk-sweep", None),
+        ("POST /portfolios/{portfolio_id}/simulate", "POST", f"/portfolios/{portfolio_id}/simulate", {"paths": 1000, "trades": 250, "seed": 1}),
+        ("GET /exposure", "GET", "/exposure", None),
+        ("GET /trades/export", "GET", f"/trades/export?format=ndjson&portfolio_id={portfolio_id}", None),
+        # Записи - в конце, чтобы не менять данные для чтений выше
+        ("POST /portfolios", "POST", "/portfolios", {"name": "Bench", "balance": 10000, "initial_balance": 10000}),
+        ("POST /trades", "POST", "/trades", trade),
+        ("PUT /trades/{trade_id}", "PUT", f"/trades/{trade_id}", {"notes": "bench"}),
+        ("POST /trades/import[100]", "POST", "/trades/import?format=ndjson", import_body),
+        ("GET /trades/import/{import_id}", "GET", "/trades/import/bench", None),
+        ("DELETE /trades/{trade_id}", "DELETE", lambda: f"/trades/{next(deleted_ids)}", None),
+    ]
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Импорт, прогресс которого читает GET /trades/import/{import_id}
+        await client.post("/trades/import?format=ndjson&import_id=bench", content=import_body)
+
+        for name, method, path, body in routes:
+            semaphore = asyncio.Semaphore(concurrency)
+            samples: List[float] = []
+            errors = 0
+
+            def request():
+                url = path() if callable(path) else path
+                if isinstance(body, bytes):
+                    return client.request(method, url, content=body)
+                return client.request(method, url, json=body)
+
+            async def one():
+                nonlocal errors
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await request()
+                    samples.append(time.perf_counter() - start)
+                    if response.status_code >= 400:
+                        errors += 1
+
+            # Прогрев: первый запрос строит кэши
+            await request()
+            started = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(requests_per_route)))
+            results[f"route.{name}"] = {**summarize(samples, time.perf_counter() - started), "errors": errors}
+
+    missing = uncovered_routes(app, [name for name, *_ in routes])
+    if missing:
+        print("Маршруты без бенчмарка (добавьте в bench_routes или EXCLUDED_ROUTES): " + ", ".join(missing))
+    return results
+
+
+async def bench_clients(url: str, requests_count: int, concurrency: int) -> Dict[str, Dict]:
+    from app.database import AsyncSupabaseClient, SupabaseClient
+
+    results = {}
+
+    sync_client = SupabaseClient(url, "bench")
+    results["client.sync.select_portfolios"] = measure(lambda: sync_client.select("portfolios"), requests_count)
+
+    async_client = AsyncSupabaseClient(url, "bench", pool_size=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await async_client.select("portfolios")
+            samples.append(time.perf_counter() - start)
+
+    await async_client.select("portfolios")
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests_count)))
+    results["client.async.select_portfolios"] = summarize(samples, time.perf_counter() - started)
+    await async_client.aclose()
+    return results
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Регрессии: рост p50 или падение ops/sec больше порога"""
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base:
+            continue
+        if base["p50_ms"] and result["p50_ms"] > base["p50_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p50 {base['p50_ms']} -> {result['p50_ms']} ms")
+        if base["ops_per_sec"] and result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: ops/sec {base['ops_per_sec']} -> {result['ops_per_sec']}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки Risk Management System")
+    parser.add_argument("--quick", action="store_true", help="Меньше данных и повторов")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Задержка фейкового PostgREST")
+    parser.add_argument("--portfolios", type=int, default=5)
+    parser.add_argument("--trades", type=int, default=10000, help="Сделок на портфель")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на маршрут")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--only", choices=["calculator", "routes", "clients"], action="append")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимое ухудшение (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.trades = min(args.trades, 2000)
+        args.requests = min(args.requests, 50)
+    sections = set(args.only or ["calculator", "routes", "clients"])
+
+    from benchmarks.fake_postgrest import FakePostgrest, ServerThread, generate_data
+
+    fake = FakePostgrest(generate_data(args.portfolios, args.trades), latency=args.latency_ms / 1000)
+    benchmarks: Dict[str, Dict] = {}
+
+    with ServerThread(fake, port=args.port) as server:
+        # Настройки читаются при импорте app - задаем их до него
+        os.environ.update({
+            "SUPABASE_URL": server.url,
+            "SUPABASE_ANON_KEY": "bench",
+            "STORAGE_BACKEND": "supabase"
+        })
+
+        if "calculator" in sections:
+            benchmarks.update(bench_calculator(args.quick))
+        if "routes" in sections:
+            from app.main import app
+            benchmarks.update(asyncio.run(bench_routes(app, fake, args.requests, args.concurrency)))
+        if "clients" in sections:
+            benchmarks.update(asyncio.run(bench_clients(server.url, args.requests, args.concurrency)))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {
+            "quick": args.quick,
+            "latency_ms": args.latency_ms,
+            "portfolios": args.portfolios,
+            "trades_per_portfolio": args.trades,
+            "requests": args.requests,
+            "concurrency": args.concurrency
+        },
+        "benchmarks": benchmarks
+    }
+
+    args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    width = max(len(name) for name in benchmarks) if benchmarks else 0
+    for name, result in benchmarks.items():
+        print(f"{name:<{width}}  p50 {result['p50_ms']:>10.3f} ms  p99 {result['p99_ms']:>10.3f} ms  {result['ops_per_sec']:>12.1f} ops/s")
+    print(f"\nРезультаты: {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"База сохранена: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("Базы для сравнения нет (--save-baseline, чтобы создать)")
+        return 0
+
+    regressions = compare(report, json.loads(args.baseline.read_text()), args.threshold)
+    if regressions:
+        print(f"\nРегрессии больше {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"Регрессий больше {args.threshold:.0%} нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 import uvicorn
 import os
 
+from app.metrics import MetricsMiddleware, registry
+from app.services.calculator import TradingCalculator
+from app.static_assets import StaticAssets
+
 # Временно отключаем .env из-за проблем с кодировкой
 # load_dotenv()
 
@@ -19,23 +21,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Подключение статических файлов
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-@app.get("/script.js")
-def get_script():
-    """Отдаем JavaScript файл"""
-    return FileResponse("static/script.js")
+# Метрики маршрутов, как в app.main: задержка, статусы, запросы в обработке
+app.add_middleware(MetricsMiddleware)
 
-@app.get("/style.css")
-def get_style():
-    """Отдаем CSS файл"""
-    return FileResponse("static/style.css")
+# Статические файлы: только из списка, сжатые при старте, с ETag
+assets = StaticAssets("static", ("index.html", "script.js", "style.css"))
+app.mount("/static", assets, name="static")
 
 @app.get("/")
-def read_root():
+def read_root(request: Request):
     """Отдаем главную страницу приложения"""
-    return FileResponse("static/index.html")
+    return assets.response("index.html", request)
 
 @app.get("/api")
 def api_root():
@@ -45,6 +41,11 @@ def api_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/config")
 def get_config():
     """Возвращает конфигурацию Supabase для фронтенда"""
@@ -59,11 +60,11 @@ def calculate_lot(risk: float, stop_loss: float):
     if risk <= 0 or stop_loss <= 0:
         return {"error": "Risk and stop loss must be greater than 0"}
     
-    lot_size = risk / stop_loss / 10
+    lot_size = TradingCalculator.calculate_lot_size(risk, stop_loss)
     return {
         "risk": risk,
         "stop_loss": stop_loss,
-        "lot_size": round(lot_size, 4)
+        "lot_size": float(lot_size)
     }
 
 # API для работы с Supabase через бэкенд
@@ -92,6 +93,9 @@ async def create_trade(trade_data: dict):
     """Заглушка для создания сделки - фронтенд работает напрямую с Supabase"""
     return {"message": "Trade created via Supabase client"}
 
+# script.js, style.css и их версии с хэшем в имени (на них ссылается index.html)
+app.mount("/", assets, name="assets")
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8001))
     uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
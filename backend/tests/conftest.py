@@ -0,0 +1,31 @@
+import os
+
+# Тесты идут на SQLite в памяти: хранилище создается при импорте app.main
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = ":memory:"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def portfolio_id(client):
+    response = client.post("/portfolios", json={"name": "Тест", "balance": 1000, "initial_balance": 1000})
+    assert response.status_code == 200
+    data = response.json()
+    return (data[0] if isinstance(data, list) else data)["id"]
+
+
+def add_trade(client, portfolio_id: str, **fields) -> dict:
+    trade = {"portfolio_id": portfolio_id, "risk_amount": 10, "stop_loss_points": 20, "lot_size": 0.05, **fields}
+    response = client.post("/trades", json=trade)
+    assert response.status_code == 200, response.text
+    return response.json()[0]
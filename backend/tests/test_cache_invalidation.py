@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+
+from app.cache import TTLCache
+from app.database import AsyncSupabaseClient
+
+
+def make_client(handler) -> AsyncSupabaseClient:
+    client = AsyncSupabaseClient("http://postgrest", "key", caches={"portfolios": TTLCache(maxsize=16, ttl=60)})
+    client._client = httpx.AsyncClient(base_url="http://postgrest/rest/v1", transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_invalidate_during_read_is_not_cached_over():
+    balance = {"value": 1000}
+    calls = []
+
+    async def scenario():
+        async def handler(request):
+            calls.append(request.url.path)
+            response = httpx.Response(200, json=[{"id": "p1", "balance": balance["value"]}])
+            if len(calls) == 1:
+                # Запись баланса завершилась, пока ответ чтения шел обратно
+                balance["value"] = 1100
+                client.invalidate("portfolios", {"id": "p1"})
+            return response
+
+        client = make_client(handler)
+        first = await client.select("portfolios", filters={"id": "p1"})
+        second = await client.select("portfolios", filters={"id": "p1"})
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["data"][0]["balance"] == 1000
+    assert second["data"][0]["balance"] == 1100
+    assert len(calls) == 2
+
+
+def test_read_after_write_is_cached():
+    calls = []
+
+    async def scenario():
+        async def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(200, json=[{"id": "p1", "balance": 1000}])
+
+        client = make_client(handler)
+        client.invalidate("portfolios", {"id": "p1"})
+        await client.select("portfolios", filters={"id": "p1"})
+        await client.select("portfolios", filters={"id": "p1"})
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
@@ -0,0 +1,43 @@
+import pytest
+
+from app.services.calculator import EXACT, FAST, TradingCalculator
+
+
+@pytest.mark.parametrize("mode", [FAST, EXACT])
+def test_batch_rejects_non_finite_rows(mode):
+    batch = TradingCalculator.calculate_lot_sizes_batch(
+        [20, float("inf"), 20, 20, 1e-300],
+        risk_amounts=[10, 10, float("nan"), float("inf"), 1e300],
+        mode=mode
+    )
+    assert batch["valid"].tolist() == [True, False, False, False, False]
+    assert batch["lot_size"].tolist() == [0.05, 0.0, 0.0, 0.0, 0.0]
+    assert [error["index"] for error in batch["errors"]] == [1, 2, 3, 4]
+    assert batch["errors"][-1]["detail"] == "Результат вне допустимого диапазона"
+
+
+def test_batch_rejects_overflowing_risk_from_balance():
+    batch = TradingCalculator.calculate_lot_sizes_batch([20, 20], balances=[1000, 1e308], risk_percentages=[1, 1e10])
+    assert batch["valid"].tolist() == [True, False]
+    assert batch["risk_amount"].tolist() == [10.0, 0.0]
+
+
+def test_batch_endpoint_returns_null_for_non_finite_rows(client):
+    body = '{"stop_loss_points": [20, 20, Infinity], "risk_amount": [10, NaN, 10]}'
+    response = client.post("/calculate-lot/batch", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 200
+    assert response.json()["lot_size"] == [0.05, None, None]
+
+
+@pytest.mark.parametrize("body", [
+    '{"risk_amount": NaN, "stop_loss_points": 20}',
+    '{"risk_amount": 10, "stop_loss_points": Infinity}',
+])
+def test_calculate_lot_rejects_non_finite(client, body):
+    response = client.post("/calculate-lot", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 400
+
+
+def test_calculate_lot_out_of_range(client):
+    response = client.post("/calculate-lot", json={"risk_amount": 1e30, "stop_loss_points": 1})
+    assert response.status_code == 400
@@ -0,0 +1,27 @@
+from conftest import add_trade
+
+
+def curve(client, portfolio_id):
+    response = client.get(f"/portfolios/{portfolio_id}/equity-curve")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_zero_result_trade_refreshes_cached_curve(client, portfolio_id):
+    add_trade(client, portfolio_id, result=50)
+    assert curve(client, portfolio_id)["trades"] == 1
+
+    # Баланс не меняется, updated_at портфеля тоже, а кривая должна обновиться
+    add_trade(client, portfolio_id, result=0)
+    assert curve(client, portfolio_id)["trades"] == 2
+
+
+def test_update_and_delete_refresh_cached_curve(client, portfolio_id):
+    trade = add_trade(client, portfolio_id)
+    assert curve(client, portfolio_id)["trades"] == 0
+
+    assert client.put(f"/trades/{trade['id']}", json={"result": 25}).status_code == 200
+    assert curve(client, portfolio_id)["trades"] == 1
+
+    assert client.delete(f"/trades/{trade['id']}").status_code == 200
+    assert curve(client, portfolio_id)["trades"] == 0
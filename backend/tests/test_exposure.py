@@ -0,0 +1,62 @@
+from functools import partial
+
+from app import main
+from app.main import exposure_index, storage
+from app.services.exposure import ExposureIndex
+
+from conftest import add_trade
+
+
+def open_trade(trade_id, risk):
+    return {"id": trade_id, "result": None, "risk_amount": risk, "lot_size": 0.1, "instrument": "EURUSD"}
+
+
+def test_build_interrupted_by_invalidate_is_discarded():
+    index = ExposureIndex()
+    build = index.begin_build()
+    index.load([open_trade("t1", 10)], build)
+    index.invalidate()
+    index.load([open_trade("t2", 20)], build)
+
+    assert index.finish_build(build) is False
+    assert not index.ready
+
+    build = index.begin_build()
+    index.load([open_trade("t1", 10), open_trade("t2", 20)], build)
+    assert index.finish_build(build)
+    assert index.query()["total"]["risk_amount"] == 30.0
+
+
+def test_exposure_rebuilds_after_invalidate_during_load(client, portfolio_id, monkeypatch):
+    add_trade(client, portfolio_id, instrument="XAUUSD", risk_amount=25)
+    exposure_index.invalidate()
+    select = storage.select
+    calls = []
+
+    async def select_racing_import(*args, **kwargs):
+        result = await select(*args, **kwargs)
+        calls.append(1)
+        if len(calls) == 1:
+            # Импорт вставил сделку после чтения страницы и сбросил индекс
+            imported = {"portfolio_id": portfolio_id, "trade_date": "2024-01-01", "instrument": "XAUUSD",
+                        "risk_amount": 40, "stop_loss_points": 20, "lot_size": 0.2}
+            await storage.insert("trades", [imported], returning="minimal")
+            exposure_index.invalidate()
+        return result
+
+    monkeypatch.setattr(storage, "select", select_racing_import)
+    response = client.get("/exposure", params={"group_by": "", "portfolio_id": portfolio_id})
+    assert response.status_code == 200
+    assert response.json()["total"]["risk_amount"] == 65.0
+    assert exposure_index.ready
+
+
+def test_exposure_loads_more_than_one_page(client, portfolio_id, monkeypatch):
+    for risk in (10, 20, 30):
+        add_trade(client, portfolio_id, instrument="US30", risk_amount=risk)
+    exposure_index.invalidate()
+    monkeypatch.setattr(main, "iter_trade_pages", partial(main.iter_trade_pages, page_size=1))
+
+    response = client.get("/exposure", params={"group_by": "", "portfolio_id": portfolio_id, "instrument": "US30"})
+    assert response.status_code == 200
+    assert response.json()["total"]["risk_amount"] == 60.0
@@ -0,0 +1,45 @@
+import sqlite3
+
+from conftest import add_trade
+
+from app.sqlite_storage import SQLiteStorage
+
+
+def test_fields_accepts_every_trades_column(client, portfolio_id):
+    add_trade(client, portfolio_id)
+    response = client.get("/trades", params={"portfolio_id": portfolio_id, "fields": "id,user_id,result"})
+    assert response.status_code == 200
+    assert list(response.json()["data"][0]) == ["id", "user_id", "result"]
+
+
+def test_unknown_field_rejected(client):
+    assert client.get("/trades", params={"fields": "id,password"}).status_code == 400
+
+
+def test_rows_and_columns_share_envelope(client, portfolio_id):
+    for i in range(3):
+        add_trade(client, portfolio_id, result=i)
+    params = {"portfolio_id": portfolio_id, "fields": "id,result", "limit": 2}
+    rows = client.get("/trades", params=params).json()
+    columns = client.get("/trades", params={**params, "format": "columns"}).json()
+
+    assert set(rows) == set(columns) == {"data", "count", "next_cursor"}
+    assert rows["count"] == columns["count"] == 2
+    assert [row["result"] for row in rows["data"]] == columns["data"]["result"]
+
+
+def test_existing_sqlite_database_gets_new_columns(tmp_path):
+    path = tmp_path / "old.db"
+    SQLiteStorage(str(path)).engine.dispose()
+    connection = sqlite3.connect(path)
+    connection.execute("DROP INDEX ix_trades_user_id")
+    connection.execute("ALTER TABLE trades DROP COLUMN user_id")
+    connection.commit()
+    connection.close()
+
+    storage = SQLiteStorage(str(path))
+    with storage.engine.connect() as connection:
+        columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(trades)")}
+        indexes = {row[1] for row in connection.exec_driver_sql("PRAGMA index_list(trades)")}
+    assert "user_id" in columns
+    assert "ix_trades_user_id" in indexes
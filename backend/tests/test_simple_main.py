@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+from app.simple_main import app
+
+client = TestClient(app)
+
+
+def test_calculate_risk_rounds_half_up():
+    # float round(5.005, 2) дает 5.0: 5.005 хранится как 5.00499...
+    response = client.post("/calculate-risk", params={"balance": 1001, "risk_percentage": 0.5})
+    assert response.json()["risk_amount"] == 5.01
+
+
+def test_full_calculation_uses_rounded_risk():
+    response = client.post("/full-calculation", params={"balance": 1001, "risk_percentage": 0.5, "stop_loss": 15})
+    assert response.json()["calculation"] == {"risk_amount": 5.01, "lot_size": 0.0334}
+
+
+def test_calculate_lot():
+    response = client.post("/calculate-lot", params={"risk": 10, "stop_loss": 30})
+    assert response.json()["lot_size"] == 0.0333
@@ -0,0 +1,27 @@
+import uuid
+
+from app.main import pubsub
+
+from conftest import add_trade
+
+
+def test_stream_over_subscriber_limit_returns_503(client, portfolio_id, monkeypatch):
+    monkeypatch.setattr(pubsub, "max_subscribers", pubsub.subscribers)
+    response = client.get("/stream", params={"portfolio_id": portfolio_id})
+    assert response.status_code == 503
+    assert pubsub.subscribers == pubsub.max_subscribers
+
+
+def test_unsubscribe_is_idempotent():
+    before = pubsub.subscribers
+    subscription = pubsub.subscribe(["portfolio:test"])
+    pubsub.unsubscribe(subscription)
+    pubsub.unsubscribe(subscription)
+    assert pubsub.subscribers == before
+    assert not pubsub.has_subscribers("portfolio:test")
+
+
+def test_create_trade_accepts_user_id(client, portfolio_id):
+    user_id = str(uuid.uuid4())
+    trade = add_trade(client, portfolio_id, user_id=user_id)
+    assert trade["user_id"] == user_id
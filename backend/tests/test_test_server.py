@@ -0,0 +1,11 @@
+from fastapi.testclient import TestClient
+
+from test_server import app
+
+
+def test_test_server_exposes_route_metrics():
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'http_requests_total{route="/health",method="GET",status="200"}' in response.text
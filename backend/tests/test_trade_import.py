@@ -0,0 +1,31 @@
+import asyncio
+
+from app.main import Trade
+from app.services.trade_import import TradeImporter
+
+
+async def chunks(text: str):
+    yield text.encode()
+
+
+def test_rejected_batch_is_bisected_down_to_bad_rows():
+    inserted = []
+
+    async def insert(batch):
+        if any(row["instrument"] == "BAD" for row in batch):
+            return {"data": None, "error": "violates foreign key constraint"}
+        inserted.extend(batch)
+        return {"data": None, "error": None}
+
+    instruments = ["EURUSD", "BAD", "XAUUSD", "GBPUSD", "BAD", "USDJPY", "EURGBP"]
+    body = "portfolio_id,instrument,risk_amount,stop_loss_points,lot_size\n" + "".join(
+        f"p1,{instrument},10,20,0.05\n" for instrument in instruments
+    )
+    importer = TradeImporter(Trade, insert, batch_size=len(instruments))
+    summary = asyncio.run(importer.run(chunks(body), "csv"))
+
+    assert [row["instrument"] for row in inserted] == ["EURUSD", "XAUUSD", "GBPUSD", "USDJPY", "EURGBP"]
+    assert summary["rows_inserted"] == 5
+    assert summary["rows_rejected"] == 2
+    assert [reject["line"] for reject in summary["rejects"]] == [3, 6]
+    assert importer.portfolio_ids == {"p1"}
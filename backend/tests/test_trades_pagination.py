@@ -0,0 +1,82 @@
+from conftest import add_trade
+
+
+def all_pages(client, **params):
+    trades, cursor = [], None
+    while True:
+        response = client.get("/trades", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        page = response.json()
+        trades.extend(page["data"])
+        assert len(trades) <= 100, "курсор не продвигается"
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return trades
+
+
+def test_cursor_walks_trades_created_in_same_second(client, portfolio_id):
+    created = [add_trade(client, portfolio_id, trade_date="2024-01-05", result=i)["id"] for i in range(3)]
+
+    for order in ("desc", "asc"):
+        ids = [trade["id"] for trade in all_pages(client, portfolio_id=portfolio_id, limit=1, order=order)]
+        assert sorted(ids) == sorted(created)
+
+
+def test_trade_without_date_gets_today(client, portfolio_id):
+    trade = add_trade(client, portfolio_id)
+    explicit_null = add_trade(client, portfolio_id, trade_date=None)
+    assert trade["trade_date"] is not None
+    assert explicit_null["trade_date"] == trade["trade_date"]
+
+
+def test_cursor_walks_trades_without_date(client, portfolio_id):
+    created = [add_trade(client, portfolio_id, result=i)["id"] for i in range(3)]
+    created.append(add_trade(client, portfolio_id, trade_date=None)["id"])
+    created.append(add_trade(client, portfolio_id, trade_date="2024-01-05")["id"])
+
+    for order in ("desc", "asc"):
+        ids = [trade["id"] for trade in all_pages(client, portfolio_id=portfolio_id, limit=1, order=order)]
+        assert sorted(ids) == sorted(created)
+
+
+def test_import_without_date_keeps_paging(client, portfolio_id):
+    body = "\n".join(
+        f'{{"portfolio_id": "{portfolio_id}", "risk_amount": 10, "stop_loss_points": 20, "lot_size": 0.05{extra}}}'
+        for extra in ("", ', "trade_date": null', ', "trade_date": "2024-02-01"')
+    )
+    response = client.post("/trades/import", params={"format": "ndjson"}, content=body)
+    assert response.status_code == 200
+    assert response.json()["rows_inserted"] == 3
+
+    trades = all_pages(client, portfolio_id=portfolio_id, limit=1)
+    assert len(trades) == 3
+    assert all(trade["trade_date"] for trade in trades)
+
+
+def test_export_includes_trades_without_date(client, portfolio_id):
+    for _ in range(3):
+        add_trade(client, portfolio_id, trade_date=None)
+    response = client.get("/trades/export", params={"portfolio_id": portfolio_id, "format": "ndjson", "page_size": 1})
+    assert response.status_code == 200
+    assert len(response.text.strip().splitlines()) == 3
+
+
+def test_export_ends_cleanly_when_upstream_fails_mid_stream(client, portfolio_id, monkeypatch, caplog):
+    from app.main import storage
+
+    for _ in range(3):
+        add_trade(client, portfolio_id)
+    select = storage.select
+    calls = []
+
+    async def failing_select(*args, **kwargs):
+        calls.append(kwargs.get("after"))
+        if len(calls) > 1:
+            return {"data": None, "error": "upstream timeout"}
+        return await select(*args, **kwargs)
+
+    monkeypatch.setattr(storage, "select", failing_select)
+    response = client.get("/trades/export", params={"portfolio_id": portfolio_id, "format": "ndjson", "page_size": 1})
+    assert response.status_code == 200
+    assert len(response.text.strip().splitlines()) == 1
+    assert "upstream timeout" in caplog.text
@@ -256,6 +256,7 @@ async function selectPortfolio() {
     if (!portfolioId) {
         document.getElementById('portfolio-info').classList.add('hidden');
         currentPortfolio = null;
+        subscribePortfolioStream(null);
         document.getElementById('save-trade-btn').disabled = true;
         return;
     }
@@ -292,6 +293,7 @@ async function selectPortfolio() {
         document.getElementById('portfolio-info').classList.remove('hidden');
         
         loadTrades();
+        subscribePortfolioStream(portfolioId);
     } catch (error) {
         showError('Ошибка загрузки портфеля: ' + error.message);
     }
@@ -370,36 +372,31 @@ async function saveTrade() {
     const notes = document.getElementById('trade-notes').value;
     
     try {
-        // Сохраняем сделку в Supabase
-        const { data, error } = await supabase
-            .from('trades')
-            .insert([{
-                portfolio_id: currentPortfolio.id,
-                user_id: currentUser.id,
-                instrument: lastCalculation.instrument || null,
-                timeframe: lastCalculation.timeframe || null,
-                risk_amount: lastCalculation.riskAmount,
-                stop_loss_points: lastCalculation.stopLoss,
-                lot_size: lastCalculation.lotSize,
-                direction: lastCalculation.direction || null,
-                result: result,
-                notes: notes || null
-            }])
-            .select();
-        
-        if (error) {
-            throw new Error(error.message);
-        }
+        // Сохраняем сделку через API: сервер обновит кэши и разошлет
+        // событие trade.created и новый баланс в /stream
+        const data = await apiCall('/trades', 'POST', {
+            portfolio_id: currentPortfolio.id,
+            user_id: currentUser.id,
+            instrument: lastCalculation.instrument || null,
+            timeframe: lastCalculation.timeframe || null,
+            risk_amount: lastCalculation.riskAmount,
+            stop_loss_points: lastCalculation.stopLoss,
+            lot_size: lastCalculation.lotSize,
+            direction: lastCalculation.direction || null,
+            result: result,
+            notes: notes || null
+        });
         
         showSuccess('Сделка сохранена успешно');
         document.getElementById('trade-result').value = '';
         document.getElementById('trade-notes').value = '';
         
-        // Баланс автоматически обновится через триггер в базе
-        // Обновляем информацию о портфеле
-        await selectPortfolio();
-        
-        loadTrades();
+        // Таблицу обновляем из ответа, не перечитывая сделки;
+        // баланс придет событием portfolio.balance
+        [].concat(data || []).forEach(trade => {
+            if (!allTrades.some(t => String(t.id) === String(trade.id))) allTrades.unshift(trade);
+        });
+        renderTrades();
     } catch (error) {
         showError('Ошибка сохранения сделки: ' + error.message);
     }
@@ -421,48 +418,113 @@ async function loadTrades() {
             throw new Error(error.message);
         }
         
-        const tbody = document.getElementById('trades-tbody');
-        tbody.innerHTML = '';
-        
         // Сохраняем сделки в кэш для быстрого доступа
         allTrades = trades || [];
-        
-        trades.forEach(trade => {
-            const row = document.createElement('tr');
-            const tradeDate = trade.trade_date || new Date(trade.created_at).toLocaleDateString('ru-RU');
-            
-            row.innerHTML = `
-                <td>${tradeDate}</td>
-                <td>${trade.instrument || '-'}</td>
-                <td>${trade.timeframe || '-'}</td>
-                <td>${trade.direction || '-'}</td>
-                <td>${trade.risk_amount}</td>
-                <td>${trade.stop_loss_points}</td>
-                <td>${trade.lot_size}</td>
-                <td style="color: ${trade.result > 0 ? 'green' : trade.result < 0 ? 'red' : 'black'}">${trade.result || '0'}</td>
-                <td>${trade.notes || '-'}</td>
-                <td>
-                    <div class="action-buttons">
-                        <button class="btn-small btn-edit" onclick="openEditModal(${trade.id})">
-                            ✏️ Изменить
-                        </button>
-                        <button class="btn-small btn-delete" onclick="deleteTrade(${trade.id})">
-                            🗑️ Удалить
-                        </button>
-                    </div>
-                </td>
-            `;
-            tbody.appendChild(row);
-        });
-        
-        // Обновляем аналитику после загрузки сделок
-        updateAnalytics();
+        renderTrades();
         
     } catch (error) {
         showError('Ошибка загрузки сделок: ' + error.message);
     }
 }
 
+// Отрисовка таблицы сделок из кэша allTrades
+function renderTrades() {
+    const tbody = document.getElementById('trades-tbody');
+    tbody.innerHTML = '';
+    
+    allTrades.forEach(trade => {
+        const row = document.createElement('tr');
+        const tradeDate = trade.trade_date || new Date(trade.created_at).toLocaleDateString('ru-RU');
+        
+        row.innerHTML = `
+            <td>${tradeDate}</td>
+            <td>${trade.instrument || '-'}</td>
+            <td>${trade.timeframe || '-'}</td>
+            <td>${trade.direction || '-'}</td>
+            <td>${trade.risk_amount}</td>
+            <td>${trade.stop_loss_points}</td>
+            <td>${trade.lot_size}</td>
+            <td style="color: ${trade.result > 0 ? 'green' : trade.result < 0 ? 'red' : 'black'}">${trade.result || '0'}</td>
+            <td>${trade.notes || '-'}</td>
+            <td>
+                <div class="action-buttons">
+                    <button class="btn-small btn-edit" onclick="openEditModal(${trade.id})">
+                        ✏️ Изменить
+                    </button>
+                    <button class="btn-small btn-delete" onclick="deleteTrade(${trade.id})">
+                        🗑️ Удалить
+                    </button>
+                </div>
+            </td>
+        `;
+        tbody.appendChild(row);
+    });
+    
+    // Обновляем аналитику после загрузки сделок
+    updateAnalytics();
+}
+
+// Подписка на изменения портфеля через /stream (Server-Sent Events):
+// сервер сам присылает новый баланс и изменения сделок, в том числе
+// сделанные из других вкладок, без повторного чтения таблиц
+let portfolioStream = null;
+let portfolioStreamId = null;
+
+function subscribePortfolioStream(portfolioId) {
+    if (portfolioStream && portfolioStreamId === portfolioId) return;
+    if (portfolioStream) {
+        portfolioStream.close();
+        portfolioStream = null;
+        portfolioStreamId = null;
+    }
+    if (!portfolioId || !window.EventSource) return;
+    
+    const stream = new EventSource(`${API_BASE_URL}/stream?portfolio_id=${encodeURIComponent(portfolioId)}`);
+    
+    stream.addEventListener('portfolio.balance', (event) => {
+        const { portfolio } = JSON.parse(event.data);
+        if (!currentPortfolio || String(currentPortfolio.id) !== String(portfolio.id)) return;
+        
+        currentPortfolio.balance = portfolio.balance;
+        currentPortfolio.riskAmount = (portfolio.balance * currentPortfolio.riskPercentage) / 100;
+        document.getElementById('current-balance').textContent = portfolio.balance;
+        document.getElementById('risk-amount').textContent = currentPortfolio.riskAmount.toFixed(2);
+    });
+    
+    stream.addEventListener('trade.created', (event) => {
+        const { trade } = JSON.parse(event.data);
+        if (allTrades.some(t => String(t.id) === String(trade.id))) return;
+        allTrades.unshift(trade);
+        renderTrades();
+    });
+    
+    stream.addEventListener('trade.updated', (event) => {
+        const { trade } = JSON.parse(event.data);
+        allTrades = allTrades.map(t => String(t.id) === String(trade.id) ? trade : t);
+        renderTrades();
+    });
+    
+    stream.addEventListener('trade.deleted', (event) => {
+        const { trade } = JSON.parse(event.data);
+        allTrades = allTrades.filter(t => String(t.id) !== String(trade.id));
+        renderTrades();
+    });
+    
+    // Сервер пропустил события (клиент отстал) - перечитываем один раз
+    stream.addEventListener('resync', () => loadTrades());
+    
+    stream.onerror = () => {
+        // Сервер без /stream (например, test_server.py) - не переподключаемся
+        if (stream.readyState === EventSource.CLOSED && portfolioStream === stream) {
+            portfolioStream = null;
+            portfolioStreamId = null;
+        }
+    };
+    
+    portfolioStream = stream;
+    portfolioStreamId = portfolioId;
+}
+
 // Утилиты для уведомлений
 function showToast(message, type = 'info', title = null, duration = 5000) {
     const container = document.getElementById('toast-container');
@@ -611,22 +673,16 @@ async function saveEditedTrade() {
     }
     
     try {
-        const { error } = await supabase
-            .from('trades')
-            .update(updatedData)
-            .eq('id', editingTradeId)
-            .eq('user_id', currentUser.id);
-        
-        if (error) {
-            throw new Error(error.message);
-        }
+        const data = await apiCall(`/trades/${editingTradeId}`, 'PUT', updatedData);
         
         showSuccess('Сделка успешно обновлена');
         closeEditModal();
         
-        // Обновляем список сделок и информацию о портфеле
-        await loadTrades();
-        await selectPortfolio(); // Обновляем баланс портфеля
+        // Баланс придет событием portfolio.balance из /stream
+        [].concat(data || []).forEach(trade => {
+            allTrades = allTrades.map(t => String(t.id) === String(trade.id) ? trade : t);
+        });
+        renderTrades();
         
     } catch (error) {
         showError('Ошибка обновления сделки: ' + error.message);
@@ -644,21 +700,13 @@ async function deleteTrade(tradeId) {
     }
     
     try {
-        const { error } = await supabase
-            .from('trades')
-            .delete()
-            .eq('id', tradeId)
-            .eq('user_id', currentUser.id);
-        
-        if (error) {
-            throw new Error(error.message);
-        }
+        await apiCall(`/trades/${tradeId}`, 'DELETE');
         
         showSuccess('Сделка успешно удалена');
         
-        // Обновляем список сделок и информацию о портфеле
-        await loadTrades();
-        await selectPortfolio(); // Обновляем баланс портфеля
+        // Баланс придет событием portfolio.balance из /stream
+        allTrades = allTrades.filter(t => String(t.id) !== String(tradeId));
+        renderTrades();
         
     } catch (error) {
         showError('Ошибка удаления сделки: ' + error.message);
@@ -15,7 +15,7 @@ CREATE TABLE IF NOT EXISTS trades (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
     portfolio_id UUID REFERENCES portfolios(id) ON DELETE CASCADE,
     user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
-    trade_date DATE DEFAULT CURRENT_DATE,
+    trade_date DATE NOT NULL DEFAULT CURRENT_DATE,
     instrument VARCHAR(50),
     timeframe VARCHAR(10),
     risk_amount DECIMAL(15,2) NOT NULL,
@@ -29,42 +29,168 @@ CREATE TABLE IF NOT EXISTS trades (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Функция для автоматического обновления баланса портфеля
+-- trade_date входит в keyset-курсор GET /trades и выгрузок: NULL выпадал бы
+-- из сравнений lt/gt, и страницы обрывались бы на первой сделке без даты.
+-- Для баз, созданных до NOT NULL:
+UPDATE trades SET trade_date = created_at::DATE WHERE trade_date IS NULL;
+ALTER TABLE trades ALTER COLUMN trade_date SET DEFAULT CURRENT_DATE;
+ALTER TABLE trades ALTER COLUMN trade_date SET NOT NULL;
+
+-- Функция для автоматического обновления баланса портфеля.
+-- Триггеры уровня оператора: изменения результата сделок суммируются по
+-- портфелям из таблиц переходов (new_trades / old_trades), и каждый
+-- затронутый портфель обновляется один раз за оператор, а не за строку.
+-- Импорт 10 000 сделок - одно UPDATE portfolios вместо 10 000 блокировок
+-- одной строки. Портфели обновляются в порядке id, чтобы параллельные
+-- операторы не взаимоблокировались. updated_at меняется у каждого
+-- затронутого портфеля, даже если сумма изменений 0 (сделка закрыта в
+-- ноль, изменена дата): по нему API узнает о записи сделок.
 CREATE OR REPLACE FUNCTION update_portfolio_balance()
 RETURNS TRIGGER AS $$
+DECLARE
+    delta RECORD;
 BEGIN
-    -- Обновляем баланс портфеля на основе результата сделки
     IF TG_OP = 'INSERT' THEN
-        UPDATE portfolios 
-        SET balance = balance + COALESCE(NEW.result, 0),
-            updated_at = NOW()
-        WHERE id = NEW.portfolio_id;
-        RETURN NEW;
+        FOR delta IN
+            SELECT portfolio_id, SUM(COALESCE(result, 0)) AS amount
+            FROM new_trades
+            GROUP BY portfolio_id
+            ORDER BY portfolio_id
+        LOOP
+            UPDATE portfolios
+            SET balance = balance + delta.amount,
+                updated_at = NOW()
+            WHERE id = delta.portfolio_id;
+        END LOOP;
     ELSIF TG_OP = 'UPDATE' THEN
-        -- Если результат изменился, корректируем баланс
-        UPDATE portfolios 
-        SET balance = balance - COALESCE(OLD.result, 0) + COALESCE(NEW.result, 0),
-            updated_at = NOW()
-        WHERE id = NEW.portfolio_id;
-        RETURN NEW;
+        -- Старый результат снимается, новый добавляется; так же учитывается
+        -- перенос сделки в другой портфель
+        FOR delta IN
+            SELECT portfolio_id, SUM(amount) AS amount
+            FROM (
+                SELECT portfolio_id, COALESCE(result, 0) AS amount FROM new_trades
+                UNION ALL
+                SELECT portfolio_id, -COALESCE(result, 0) FROM old_trades
+            ) changes
+            GROUP BY portfolio_id
+            ORDER BY portfolio_id
+        LOOP
+            UPDATE portfolios
+            SET balance = balance + delta.amount,
+                updated_at = NOW()
+            WHERE id = delta.portfolio_id;
+        END LOOP;
     ELSIF TG_OP = 'DELETE' THEN
-        -- Убираем результат удаленной сделки из баланса
-        UPDATE portfolios 
-        SET balance = balance - COALESCE(OLD.result, 0),
-            updated_at = NOW()
-        WHERE id = OLD.portfolio_id;
-        RETURN OLD;
+        -- Убираем результаты удаленных сделок из баланса
+        FOR delta IN
+            SELECT portfolio_id, SUM(COALESCE(result, 0)) AS amount
+            FROM old_trades
+            GROUP BY portfolio_id
+            ORDER BY portfolio_id
+        LOOP
+            UPDATE portfolios
+            SET balance = balance - delta.amount,
+                updated_at = NOW()
+            WHERE id = delta.portfolio_id;
+        END LOOP;
     END IF;
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Создание триггера для автоматического обновления баланса
+-- Создание триггеров для автоматического обновления баланса (таблицы
+-- переходов допускают только одно событие на триггер - их три)
 DROP TRIGGER IF EXISTS trigger_update_portfolio_balance ON trades;
-CREATE TRIGGER trigger_update_portfolio_balance
-    AFTER INSERT OR UPDATE OR DELETE ON trades
-    FOR EACH ROW
+DROP TRIGGER IF EXISTS trigger_update_portfolio_balance_insert ON trades;
+DROP TRIGGER IF EXISTS trigger_update_portfolio_balance_update ON trades;
+DROP TRIGGER IF EXISTS trigger_update_portfolio_balance_delete ON trades;
+CREATE TRIGGER trigger_update_portfolio_balance_insert
+    AFTER INSERT ON trades
+    REFERENCING NEW TABLE AS new_trades
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_portfolio_balance();
+CREATE TRIGGER trigger_update_portfolio_balance_update
+    AFTER UPDATE ON trades
+    REFERENCING OLD TABLE AS old_trades NEW TABLE AS new_trades
+    FOR EACH STATEMENT
     EXECUTE FUNCTION update_portfolio_balance();
+CREATE TRIGGER trigger_update_portfolio_balance_delete
+    AFTER DELETE ON trades
+    REFERENCING OLD TABLE AS old_trades
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_portfolio_balance();
+
+-- Сверка балансов: balance должен равняться initial_balance плюс сумма
+-- результатов сделок. Возвращает портфели (один или все) с ожидаемым
+-- балансом и расхождением; p_fix = TRUE записывает ожидаемый баланс там,
+-- где есть расхождение. Сверка читает без блокировок и не мешает записи
+-- сделок; блокируется только портфель с расхождением при p_fix, и только
+-- на время его повторной проверки и исправления.
+-- POST /portfolios/{id}/balance/recompute вызывает ее через PostgREST;
+-- периодически - BALANCE_RECONCILE_INTERVAL в API или pg_cron:
+--   SELECT cron.schedule('reconcile-balances', '17 * * * *',
+--       $$SELECT * FROM reconcile_portfolio_balances(NULL, TRUE) WHERE drift <> 0$$);
+CREATE OR REPLACE FUNCTION reconcile_portfolio_balances(
+    p_portfolio_id UUID DEFAULT NULL,
+    p_fix BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+    portfolio_id UUID,
+    stored_balance NUMERIC,
+    expected_balance NUMERIC,
+    drift NUMERIC,
+    fixed BOOLEAN
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    checked RECORD;
+BEGIN
+    FOR checked IN
+        SELECT p.id,
+               p.balance AS stored,
+               p.initial_balance + COALESCE(totals.total, 0) AS computed
+        FROM portfolios p
+        LEFT JOIN (
+            SELECT t.portfolio_id AS id, SUM(t.result) AS total
+            FROM trades t
+            WHERE p_portfolio_id IS NULL OR t.portfolio_id = p_portfolio_id
+            GROUP BY t.portfolio_id
+        ) totals ON totals.id = p.id
+        WHERE p_portfolio_id IS NULL OR p.id = p_portfolio_id
+        ORDER BY p.id
+    LOOP
+        portfolio_id := checked.id;
+        stored_balance := checked.stored;
+        expected_balance := checked.computed;
+        fixed := FALSE;
+
+        IF p_fix AND checked.computed <> checked.stored THEN
+            -- Расхождение могла дать сделка, записанная после чтения выше:
+            -- блокируем портфель и считаем заново отдельным оператором, он
+            -- видит все сделки, чьи триггеры уже изменили баланс
+            PERFORM 1 FROM portfolios p WHERE p.id = checked.id FOR UPDATE;
+            SELECT p.balance,
+                   p.initial_balance + COALESCE((SELECT SUM(t.result) FROM trades t WHERE t.portfolio_id = p.id), 0)
+            INTO stored_balance, expected_balance
+            FROM portfolios p
+            WHERE p.id = checked.id;
+
+            IF expected_balance <> stored_balance THEN
+                UPDATE portfolios p
+                SET balance = expected_balance,
+                    updated_at = NOW()
+                WHERE p.id = checked.id;
+                fixed := TRUE;
+            END IF;
+        END IF;
+
+        drift := expected_balance - stored_balance;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
 
 -- Функция для обновления updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -121,6 +247,64 @@ CREATE INDEX IF NOT EXISTS idx_portfolios_user_id ON portfolios(user_id);
 CREATE INDEX IF NOT EXISTS idx_trades_portfolio_id ON trades(portfolio_id);
 CREATE INDEX IF NOT EXISTS idx_trades_user_id ON trades(user_id);
 CREATE INDEX IF NOT EXISTS idx_trades_trade_date ON trades(trade_date);
+-- Keyset-пагинация GET /trades (ORDER BY trade_date, created_at, id)
+CREATE INDEX IF NOT EXISTS idx_trades_portfolio_page ON trades(portfolio_id, trade_date DESC, created_at DESC, id DESC);
+
+-- Разбивка статистики (trade_breakdown): сканирует только этот индекс
+CREATE INDEX IF NOT EXISTS idx_trades_portfolio_breakdown ON trades(portfolio_id, trade_date) INCLUDE (instrument, timeframe, result);
+
+-- Статистика сделок портфеля по инструменту, таймфрейму и месяцу
+-- (GET /portfolios/{id}/breakdown, вызов через PostgREST: POST /rest/v1/rpc/trade_breakdown).
+-- p_group_by - подмножество {instrument, timeframe, month}; измерение вне
+-- списка в ответе NULL и не делит группы. Выполняется с правами
+-- вызывающего, поэтому политики RLS на trades действуют.
+CREATE OR REPLACE FUNCTION trade_breakdown(
+    p_portfolio_id UUID,
+    p_group_by TEXT[] DEFAULT ARRAY['instrument', 'timeframe', 'month'],
+    p_date_from DATE DEFAULT NULL,
+    p_date_to DATE DEFAULT NULL
+)
+RETURNS TABLE (
+    instrument VARCHAR(50),
+    timeframe VARCHAR(10),
+    month DATE,
+    total_trades BIGINT,
+    completed_trades BIGINT,
+    winning_trades BIGINT,
+    losing_trades BIGINT,
+    win_rate NUMERIC,
+    total_profit NUMERIC,
+    total_loss NUMERIC,
+    net_pnl NUMERIC,
+    average_win NUMERIC,
+    average_loss NUMERIC
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        CASE WHEN 'instrument' = ANY(p_group_by) THEN t.instrument END,
+        CASE WHEN 'timeframe' = ANY(p_group_by) THEN t.timeframe END,
+        CASE WHEN 'month' = ANY(p_group_by) THEN date_trunc('month', t.trade_date)::DATE END,
+        COUNT(*),
+        COUNT(t.result),
+        COUNT(*) FILTER (WHERE t.result > 0),
+        COUNT(*) FILTER (WHERE t.result < 0),
+        COALESCE(ROUND(COUNT(*) FILTER (WHERE t.result > 0) * 100.0 / NULLIF(COUNT(t.result), 0), 2), 0),
+        COALESCE(SUM(t.result) FILTER (WHERE t.result > 0), 0),
+        COALESCE(SUM(t.result) FILTER (WHERE t.result < 0), 0),
+        COALESCE(SUM(t.result), 0),
+        COALESCE(ROUND(AVG(t.result) FILTER (WHERE t.result > 0), 2), 0),
+        COALESCE(ROUND(AVG(t.result) FILTER (WHERE t.result < 0), 2), 0)
+    FROM trades t
+    WHERE t.portfolio_id = p_portfolio_id
+      AND (p_date_from IS NULL OR t.trade_date >= p_date_from)
+      AND (p_date_to IS NULL OR t.trade_date <= p_date_to)
+    GROUP BY 1, 2, 3
+    ORDER BY 3 NULLS FIRST, 1 NULLS FIRST, 2 NULLS FIRST;
+$$;
+
+-- PostgREST кэширует схему: новые функции видны после перезагрузки
+NOTIFY pgrst, 'reload schema';
 
 -- Вставка примерных данных (опционально)
 -- INSERT INTO portfolios (user_id, name, balance, initial_balance, risk_percentage) 
@@ -128,4 +312,6 @@ CREATE INDEX IF NOT EXISTS idx_trades_trade_date ON trades(trade_date);
 
 COMMENT ON TABLE portfolios IS 'Таблица торговых портфелей пользователей';
 COMMENT ON TABLE trades IS 'Таблица торговых сделок';
-COMMENT ON FUNCTION update_portfolio_balance() IS 'Автоматическое обновление баланса портфеля при изменении сделок'; 
\ No newline at end of file
+COMMENT ON FUNCTION update_portfolio_balance() IS 'Автоматическое обновление баланса портфеля при изменении сделок (один UPDATE на портфель за оператор)';
+COMMENT ON FUNCTION reconcile_portfolio_balances(UUID, BOOLEAN) IS 'Сверка баланса портфелей с initial_balance + сумма результатов сделок';
+COMMENT ON FUNCTION trade_breakdown(UUID, TEXT[], DATE, DATE) IS 'Статистика сделок портфеля по инструменту, таймфрейму и месяцу';
\ No newline at end of file